@@ -0,0 +1,77 @@
+"""denormalized conversation response timestamps
+
+Revision ID: 0006_conversation_response_times
+Revises: 0005_tenant_uniques
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006_conversation_response_times"
+down_revision = "0005_tenant_uniques"
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH = 5000
+
+BACKFILL_SQL = sa.text(
+    """
+    WITH last_msg AS (
+        SELECT conversation_id, MAX(created_at) AS last_at
+        FROM messages
+        WHERE conversation_id BETWEEN :lo AND :hi
+        GROUP BY conversation_id
+    ),
+    first_user AS (
+        SELECT conversation_id, MIN(id) AS message_id
+        FROM messages
+        WHERE conversation_id BETWEEN :lo AND :hi AND role = 'user'
+        GROUP BY conversation_id
+    ),
+    first_assistant AS (
+        SELECT m.conversation_id, MIN(m.id) AS message_id
+        FROM messages m
+        JOIN first_user fu ON fu.conversation_id = m.conversation_id
+        WHERE m.role = 'assistant' AND m.id > fu.message_id
+        GROUP BY m.conversation_id
+    )
+    UPDATE conversations c
+    SET first_user_at = mu.created_at,
+        first_assistant_at = ma.created_at,
+        last_message_at = lm.last_at
+    FROM last_msg lm
+    LEFT JOIN first_user fu ON fu.conversation_id = lm.conversation_id
+    LEFT JOIN messages mu ON mu.id = fu.message_id
+    LEFT JOIN first_assistant fa ON fa.conversation_id = lm.conversation_id
+    LEFT JOIN messages ma ON ma.id = fa.message_id
+    WHERE c.id = lm.conversation_id
+    """
+)
+
+
+def upgrade():
+    op.add_column("conversations", sa.Column("first_user_at", sa.DateTime(), nullable=True))
+    op.add_column("conversations", sa.Column("first_assistant_at", sa.DateTime(), nullable=True))
+    op.add_column("conversations", sa.Column("last_message_at", sa.DateTime(), nullable=True))
+
+    conn = op.get_bind()
+    lo, hi = conn.execute(sa.text("SELECT MIN(id), MAX(id) FROM conversations")).one()
+    if lo is not None:
+        for start in range(lo, hi + 1, BACKFILL_BATCH):
+            conn.execute(BACKFILL_SQL, {"lo": start, "hi": start + BACKFILL_BATCH - 1})
+
+    op.create_index(
+        "ix_conversations_tenant_first_user_at", "conversations", ["tenant_id", "first_user_at"]
+    )
+    op.create_index(
+        "ix_conversations_tenant_last_message_at", "conversations", ["tenant_id", "last_message_at"]
+    )
+
+
+def downgrade():
+    op.drop_index("ix_conversations_tenant_last_message_at", table_name="conversations")
+    op.drop_index("ix_conversations_tenant_first_user_at", table_name="conversations")
+    op.drop_column("conversations", "last_message_at")
+    op.drop_column("conversations", "first_assistant_at")
+    op.drop_column("conversations", "first_user_at")
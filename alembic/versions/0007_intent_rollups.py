@@ -0,0 +1,72 @@
+"""message intent + daily intent rollups
+
+Revision ID: 0007_intent_rollups
+Revises: 0006_conversation_response_times
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007_intent_rollups"
+down_revision = "0006_conversation_response_times"
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH = 50000
+
+# Frozen copy of the triage keywords at the time of this migration.
+LEAD_KEYWORDS = ["price", "pricing", "quote", "cost", "book", "demo", "buy", "service"]
+TICKET_KEYWORDS = ["error", "bug", "issue", "not working", "problem", "help"]
+
+
+def _like_any(keywords):
+    return "ARRAY[" + ", ".join(f"'%{k}%'" for k in keywords) + "]"
+
+
+BACKFILL_SQL = sa.text(
+    f"""
+    UPDATE messages
+    SET intent = CASE
+        WHEN lower(content) LIKE ANY ({_like_any(LEAD_KEYWORDS)}) THEN 'lead'
+        WHEN lower(content) LIKE ANY ({_like_any(TICKET_KEYWORDS)}) THEN 'ticket'
+        ELSE 'general'
+    END
+    WHERE role = 'user' AND id BETWEEN :lo AND :hi
+    """
+)
+
+
+def upgrade():
+    op.add_column("messages", sa.Column("intent", sa.String(length=20), nullable=True))
+
+    op.create_table(
+        "intent_daily_counts",
+        sa.Column("tenant_id", sa.Integer, sa.ForeignKey("tenants.id"), primary_key=True),
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column("intent", sa.String(length=20), primary_key=True),
+        sa.Column("count", sa.Integer, nullable=False, server_default="0"),
+    )
+
+    conn = op.get_bind()
+    lo, hi = conn.execute(sa.text("SELECT MIN(id), MAX(id) FROM messages")).one()
+    if lo is not None:
+        for start in range(lo, hi + 1, BACKFILL_BATCH):
+            conn.execute(BACKFILL_SQL, {"lo": start, "hi": start + BACKFILL_BATCH - 1})
+
+    conn.execute(
+        sa.text(
+            """
+            INSERT INTO intent_daily_counts (tenant_id, day, intent, count)
+            SELECT tenant_id, CAST(created_at AS DATE), intent, COUNT(*)
+            FROM messages
+            WHERE role = 'user' AND tenant_id IS NOT NULL AND intent IS NOT NULL
+            GROUP BY tenant_id, CAST(created_at AS DATE), intent
+            """
+        )
+    )
+
+
+def downgrade():
+    op.drop_table("intent_daily_counts")
+    op.drop_column("messages", "intent")
@@ -0,0 +1,50 @@
+"""hourly metrics rollups
+
+Revision ID: 0008_metrics_hourly
+Revises: 0007_intent_rollups
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008_metrics_hourly"
+down_revision = "0007_intent_rollups"
+branch_labels = None
+depends_on = None
+
+COUNTERS = [
+    "messages",
+    "leads_created",
+    "tickets_created",
+    "drafts_created",
+    "drafts_approved",
+    "drafts_rejected",
+    "first_response_count",
+]
+
+
+def upgrade():
+    op.add_column("automation_drafts", sa.Column("rejected_at", sa.DateTime(timezone=True), nullable=True))
+
+    op.create_table(
+        "metrics_hourly",
+        sa.Column("tenant_id", sa.Integer, sa.ForeignKey("tenants.id"), primary_key=True),
+        sa.Column("hour", sa.DateTime(), primary_key=True),
+        *[sa.Column(c, sa.Integer, nullable=False, server_default="0") for c in COUNTERS],
+        sa.Column("first_response_sum_sec", sa.Float, nullable=False, server_default="0"),
+    )
+
+    # watermarks start at 0, so the first rollup run backfills history in batches
+    op.create_table(
+        "rollup_watermarks",
+        sa.Column("name", sa.String(length=50), primary_key=True),
+        sa.Column("last_id", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("last_at", sa.DateTime(), nullable=True),
+    )
+
+
+def downgrade():
+    op.drop_table("rollup_watermarks")
+    op.drop_table("metrics_hourly")
+    op.drop_column("automation_drafts", "rejected_at")
@@ -0,0 +1,37 @@
+"""per-tenant classification taxonomy
+
+Revision ID: 0009_tenant_taxonomy
+Revises: 0008_metrics_hourly
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0009_tenant_taxonomy"
+down_revision = "0008_metrics_hourly"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("tenants", sa.Column("taxonomy_version", sa.Integer, nullable=False, server_default="0"))
+
+    # tenants without rows for a dimension keep the built-in keyword lists
+    op.create_table(
+        "taxonomy_keywords",
+        sa.Column("id", sa.Integer, primary_key=True, autoincrement=True),
+        sa.Column("tenant_id", sa.Integer, sa.ForeignKey("tenants.id"), nullable=False),
+        sa.Column("dimension", sa.String(length=30), nullable=False),
+        sa.Column("label", sa.String(length=100), nullable=False),
+        sa.Column("rank", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("keyword", sa.String(length=255), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.text("now()")),
+    )
+    op.create_index("ix_taxonomy_keywords_tenant_id", "taxonomy_keywords", ["tenant_id"])
+
+
+def downgrade():
+    op.drop_index("ix_taxonomy_keywords_tenant_id", table_name="taxonomy_keywords")
+    op.drop_table("taxonomy_keywords")
+    op.drop_column("tenants", "taxonomy_version")
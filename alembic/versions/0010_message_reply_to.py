@@ -0,0 +1,24 @@
+"""link assistant replies to the user message they answer
+
+Revision ID: 0010_message_reply_to
+Revises: 0009_tenant_taxonomy
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0010_message_reply_to"
+down_revision = "0009_tenant_taxonomy"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("messages", sa.Column("reply_to_id", sa.Integer, sa.ForeignKey("messages.id"), nullable=True))
+    op.create_index("ix_messages_reply_to_id", "messages", ["reply_to_id"])
+
+
+def downgrade():
+    op.drop_index("ix_messages_reply_to_id", table_name="messages")
+    op.drop_column("messages", "reply_to_id")
@@ -0,0 +1,22 @@
+"""composite index for reading the tail of a conversation
+
+Revision ID: 0011_messages_conversation_tail
+Revises: 0010_message_reply_to
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+
+revision = "0011_messages_conversation_tail"
+down_revision = "0010_message_reply_to"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # ORDER BY id DESC LIMIT n within one conversation is a backward index scan
+    op.create_index("ix_messages_conversation_id_id", "messages", ["conversation_id", "id"])
+
+
+def downgrade():
+    op.drop_index("ix_messages_conversation_id_id", table_name="messages")
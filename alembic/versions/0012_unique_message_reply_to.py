@@ -0,0 +1,31 @@
+"""at most one reply per user message
+
+Revision ID: 0012_unique_message_reply_to
+Revises: 0011_messages_conversation_tail
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+
+revision = "0012_unique_message_reply_to"
+down_revision = "0011_messages_conversation_tail"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # replies from racing reply jobs: keep the messages, only the first stays linked
+    op.execute(
+        """
+        UPDATE messages m SET reply_to_id = NULL
+        WHERE m.reply_to_id IS NOT NULL
+          AND EXISTS (SELECT 1 FROM messages o WHERE o.reply_to_id = m.reply_to_id AND o.id < m.id)
+        """
+    )
+    op.drop_index("ix_messages_reply_to_id", table_name="messages")
+    op.create_index("ix_messages_reply_to_id", "messages", ["reply_to_id"], unique=True)
+
+
+def downgrade():
+    op.drop_index("ix_messages_reply_to_id", table_name="messages")
+    op.create_index("ix_messages_reply_to_id", "messages", ["reply_to_id"])
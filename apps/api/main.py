@@ -7,7 +7,7 @@ from core import models
 from apps.api.routers import admin
 from core.db_wait import wait_for_db
 from apps.api.routers import admin_leads
-from apps.api.routers.auth import get_current_user
+from apps.api.routers.auth import get_current_user, get_current_user_async
 
 wait_for_db(engine)
 
@@ -16,8 +16,8 @@ app = FastAPI(title=settings.app_name)
 app.include_router(health.router, tags=["health"])
 app.include_router(auth.router)
 app.include_router(ingest.router, prefix="/ingest", tags=["ingest"], dependencies=[Depends(get_current_user)])
-app.include_router(chat.router, prefix="/chat", tags=["chat"], dependencies=[Depends(get_current_user)])
+app.include_router(chat.router, prefix="/chat", tags=["chat"], dependencies=[Depends(get_current_user_async)])
 app.include_router(crm.router, prefix="/crm", tags=["crm"], dependencies=[Depends(get_current_user)])
-app.include_router(conversations.router, prefix="/conversations", tags=["conversations"], dependencies=[Depends(get_current_user)])
+app.include_router(conversations.router, prefix="/conversations", tags=["conversations"], dependencies=[Depends(get_current_user_async)])
 app.include_router(admin.router, prefix="/admin", tags=["admin"], dependencies=[Depends(get_current_user)])
 app.include_router(admin_leads.router, dependencies=[Depends(get_current_user)])
@@ -1,111 +1,168 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import Date, case, cast, func, literal_column, select
+from sqlalchemy.dialects.postgresql import array
 from sqlalchemy.orm import Session
 
-from datetime import datetime
+import hashlib
+import json
+from datetime import date, datetime, timedelta
 from core.models.crm import Lead, Ticket, Conversation, Message
 
 from core.db import get_db
-from core.models.crm import Lead, Ticket, Contact, AutomationDraft, Conversation, Message, LeadScoreRule, LeadEvent
-from apps.api.utils.support import classify_ticket, suggested_macros
-from apps.api.routers.auth import get_current_user
+from core.models.crm import Lead, Ticket, Contact, AutomationDraft, Conversation, Message, LeadScoreRule, LeadEvent, TaxonomyKeyword
+from apps.api.utils.classifier import TAXONOMY, bump_taxonomy_version, get_classifier, tenant_taxonomy
+from apps.api.utils.reclassify import reclassify_tenant_tickets
+from apps.api.utils.support import classify_intent, classify_ticket, suggested_macros
+from core.analytics import increment_intent_count
+from core.cache import bump_versions, cached
+from core.llm.cache import llm_cache_stats
+from core.llm.resilience import breaker_state
+from core.queue import enqueue_unique, get_queue
+from core.ratelimit import limiter_state
+from core.reply_cache import clear_tenant, reply_cache_process_stats, reply_cache_stats
+from core.scoring import recompute_tenant_scores
+from core.simulation import load_lead_frame, simulate
+from core.models.analytics import IntentDailyCount, MetricsHourly
+from apps.api.routers.auth import get_current_user, require_admin
 from core.models.crm import User
-from pydantic import BaseModel
+from typing import Annotated
+from pydantic import BaseModel, Field
+from rq.exceptions import NoSuchJobError
+from rq.job import Job
 
 router = APIRouter()
 
 
-def _classify_intent(text: str) -> str:
-    text_l = (text or "").lower()
-    if any(k in text_l for k in ["price", "pricing", "quote", "cost", "book", "demo", "buy", "service"]):
-        return "lead"
-    if any(k in text_l for k in ["error", "bug", "issue", "not working", "problem", "help"]):
-        return "ticket"
-    return "general"
+def _compute_metrics(db: Session, tenant_id: int) -> dict:
+    def _count(model):
+        return select(func.count()).select_from(model).where(model.tenant_id == tenant_id).scalar_subquery()
 
+    drafts = (
+        select(
+            func.count().label("total"),
+            func.count().filter(AutomationDraft.status == "pending").label("pending"),
+            func.count().filter(AutomationDraft.status == "approved").label("approved"),
+        )
+        .where(AutomationDraft.tenant_id == tenant_id)
+        .subquery()
+    )
 
-def _apply_rule(lead: Lead, rule: LeadScoreRule) -> int:
-    field_value = ""
-    if rule.field == "summary":
-        field_value = (lead.summary or "").lower()
-    elif rule.field == "status":
-        field_value = (lead.status or "").lower()
+    # Avg response time: first assistant reply after first user msg per conversation
+    avg_response_sec = (
+        select(
+            func.avg(func.extract("epoch", Conversation.first_assistant_at - Conversation.first_user_at))
+        )
+        .where(Conversation.tenant_id == tenant_id, Conversation.first_assistant_at.is_not(None))
+        .scalar_subquery()
+    )
 
-    rule_value = (rule.value or "").lower()
-    if rule.operator == "contains" and rule_value in field_value:
-        return rule.points
-    if rule.operator == "equals" and rule_value == field_value:
-        return rule.points
-    return 0
+    counts = db.execute(
+        select(
+            _count(Contact).label("contacts"),
+            _count(Lead).label("leads"),
+            _count(Ticket).label("tickets"),
+            _count(Conversation).label("conversations"),
+            _count(Message).label("messages"),
+            drafts.c.total,
+            drafts.c.pending,
+            drafts.c.approved,
+            avg_response_sec.label("avg_response_sec"),
+        ).select_from(drafts)
+    ).one()
+
+    return {
+        "contacts": counts.contacts,
+        "leads": counts.leads,
+        "tickets": counts.tickets,
+        "conversations": counts.conversations,
+        "messages": counts.messages,
+        "drafts_total": counts.total,
+        "drafts_pending": counts.pending,
+        "drafts_approved": counts.approved,
+        "avg_response_sec": float(counts.avg_response_sec) if counts.avg_response_sec is not None else None,
+    }
 
 
 @router.get("/metrics")
 def get_metrics(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    tenant_id = user.tenant_id
-    contacts = db.query(Contact).filter(Contact.tenant_id == tenant_id).count()
-    leads = db.query(Lead).filter(Lead.tenant_id == tenant_id).count()
-    tickets = db.query(Ticket).filter(Ticket.tenant_id == tenant_id).count()
-    conversations = db.query(Conversation).filter(Conversation.tenant_id == tenant_id).count()
-    messages = db.query(Message).filter(Message.tenant_id == tenant_id).count()
-    drafts_total = db.query(AutomationDraft).filter(AutomationDraft.tenant_id == tenant_id).count()
-    drafts_pending = (
-        db.query(AutomationDraft)
-        .filter(AutomationDraft.tenant_id == tenant_id, AutomationDraft.status == "pending")
-        .count()
+    metrics = cached(
+        user.tenant_id,
+        "metrics",
+        ["contacts", "leads", "tickets", "conversations", "drafts"],
+        lambda: _compute_metrics(db, user.tenant_id),
     )
-    drafts_approved = (
-        db.query(AutomationDraft)
-        .filter(AutomationDraft.tenant_id == tenant_id, AutomationDraft.status == "approved")
-        .count()
-    )
-
-    # Avg response time: first assistant reply after first user msg per conversation
-    avg_response_sec = None
-    convo_ids = [c.id for c in db.query(Conversation.id).filter(Conversation.tenant_id == tenant_id).all()]
-    deltas = []
-    for cid in convo_ids:
-        msgs = (
-            db.query(Message)
-            .filter(Message.conversation_id == cid)
-            .order_by(Message.id.asc())
-            .all()
+    # live admission-control state, never served from the metrics cache
+    return {**metrics, "limiter": limiter_state(user.tenant_id)}
+
+
+TIMESERIES_COLUMNS = [
+    "messages",
+    "leads_created",
+    "tickets_created",
+    "drafts_created",
+    "drafts_approved",
+    "drafts_rejected",
+]
+
+
+@router.get("/metrics/timeseries")
+def get_metrics_timeseries(
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+    days: int = Query(default=7, ge=1, le=366),
+    bucket: str = Query(default="hour", pattern="^(hour|day)$"),
+):
+    since = datetime.utcnow() - timedelta(days=days)
+    ts = func.date_trunc(literal_column(f"'{bucket}'"), MetricsHourly.hour)
+    rows = db.execute(
+        select(
+            ts.label("ts"),
+            *[func.sum(getattr(MetricsHourly, c)).label(c) for c in TIMESERIES_COLUMNS],
+            func.sum(MetricsHourly.first_response_sum_sec).label("first_response_sum_sec"),
+            func.sum(MetricsHourly.first_response_count).label("first_response_count"),
         )
-        first_user = next((m for m in msgs if m.role == "user"), None)
-        if not first_user:
-            continue
-        first_assistant = next((m for m in msgs if m.role == "assistant" and m.id > first_user.id), None)
-        if not first_assistant:
-            continue
-        deltas.append((first_assistant.created_at - first_user.created_at).total_seconds())
-
-    if deltas:
-        avg_response_sec = sum(deltas) / len(deltas)
+        .where(MetricsHourly.tenant_id == user.tenant_id, MetricsHourly.hour >= since)
+        .group_by(ts)
+        .order_by(ts)
+    ).all()
 
-    return {
-        "contacts": contacts,
-        "leads": leads,
-        "tickets": tickets,
-        "conversations": conversations,
-        "messages": messages,
-        "drafts_total": drafts_total,
-        "drafts_pending": drafts_pending,
-        "drafts_approved": drafts_approved,
-        "avg_response_sec": avg_response_sec,
-    }
+    return [
+        {
+            "ts": r.ts.isoformat(),
+            **{c: int(getattr(r, c)) for c in TIMESERIES_COLUMNS},
+            "avg_response_sec": (
+                float(r.first_response_sum_sec) / r.first_response_count if r.first_response_count else None
+            ),
+        }
+        for r in rows
+    ]
 
 
 @router.get("/intent")
-def get_intent_distribution(db: Session = Depends(get_db), user: User = Depends(get_current_user), limit: int = 200):
-    rows = (
-        db.query(Message)
-        .filter(Message.role == "user", Message.tenant_id == user.tenant_id)
-        .order_by(Message.id.desc())
-        .limit(limit)
-        .all()
-    )
-    counts = {"lead": 0, "ticket": 0, "general": 0}
-    for m in rows:
-        counts[_classify_intent(m.content)] += 1
-    return counts
+def get_intent_distribution(
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+    since: date | None = None,
+    until: date | None = None,
+):
+    def _load():
+        q = (
+            select(IntentDailyCount.intent, func.sum(IntentDailyCount.count))
+            .where(IntentDailyCount.tenant_id == user.tenant_id)
+            .group_by(IntentDailyCount.intent)
+        )
+        if since is not None:
+            q = q.where(IntentDailyCount.day >= since)
+        if until is not None:
+            q = q.where(IntentDailyCount.day <= until)
+
+        counts = {"lead": 0, "ticket": 0, "general": 0}
+        for intent, total in db.execute(q).all():
+            counts[intent] = int(total)
+        return counts
+
+    params = {"since": since, "until": until}
+    return cached(user.tenant_id, "intent", ["conversations"], _load, params=params)
 
 
 @router.post("/seed-demo")
@@ -157,11 +214,18 @@ def seed_demo(db: Session = Depends(get_db), user: User = Depends(get_current_us
         .count()
     )
     if existing_msgs == 0:
-        m1 = Message(conversation_id=conv1.id, tenant_id=user.tenant_id, role="user", content="We need HubSpot + WhatsApp integration.")
-        m2 = Message(conversation_id=conv1.id, tenant_id=user.tenant_id, role="assistant", content="Got it. Which CRM team owns routing today?")
-        m3 = Message(conversation_id=conv2.id, tenant_id=user.tenant_id, role="user", content="Login error on mobile app, getting 500.")
-        m4 = Message(conversation_id=conv2.id, tenant_id=user.tenant_id, role="assistant", content="Thanks. Can you share device + exact error?")
+        now = datetime.utcnow()
+        m1 = Message(conversation_id=conv1.id, tenant_id=user.tenant_id, role="user", content="We need HubSpot + WhatsApp integration.", created_at=now)
+        m2 = Message(conversation_id=conv1.id, tenant_id=user.tenant_id, role="assistant", content="Got it. Which CRM team owns routing today?", created_at=now)
+        m3 = Message(conversation_id=conv2.id, tenant_id=user.tenant_id, role="user", content="Login error on mobile app, getting 500.", created_at=now)
+        m4 = Message(conversation_id=conv2.id, tenant_id=user.tenant_id, role="assistant", content="Thanks. Can you share device + exact error?", created_at=now)
         db.add_all([m1, m2, m3, m4])
+        classifier = get_classifier(db, user.tenant_id)
+        for convo, msg in [(conv1, m1), (conv1, m2), (conv2, m3), (conv2, m4)]:
+            convo.record_message(msg.role, msg.created_at)
+            if msg.role == "user":
+                msg.intent = classify_intent(msg.content, classifier)
+                increment_intent_count(db, user.tenant_id, msg.created_at.date(), msg.intent)
 
     lead = (
         db.query(Lead)
@@ -205,10 +269,30 @@ def seed_demo(db: Session = Depends(get_db), user: User = Depends(get_current_us
         )
         db.add(draft)
     db.commit()
+    bump_versions(user.tenant_id, "contacts", "leads", "tickets", "conversations", "drafts")
 
     return {"ok": True, "seeded": True}
 
 
+def _rule_predicate_args(rule: LeadScoreRule) -> dict:
+    return {"field": rule.field, "operator": rule.operator, "value": rule.value}
+
+
+def _enqueue_rule_rescore(tenant_id: int, rule: LeadScoreRule | None, before: dict | None = None) -> None:
+    # only leads matched by the old or new predicate can change score
+    predicates = [p for p in [before, _rule_predicate_args(rule) if rule else None] if p]
+    # a queued job would run with the predicates it was queued with, so only identical
+    # predicate sets (e.g. repeated points edits of one rule) may collapse into one job
+    digest = hashlib.sha1(json.dumps(predicates, sort_keys=True).encode()).hexdigest()[:16]
+    enqueue_unique(
+        "apps.worker.jobs.rescore_leads_matching",
+        tenant_id,
+        predicates,
+        job_id=f"rescore_rules:{tenant_id}:{digest}",
+        job_timeout=3600,
+    )
+
+
 @router.get("/score/rules")
 def list_score_rules(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
     rows = (
@@ -232,6 +316,19 @@ def list_score_rules(db: Session = Depends(get_db), user: User = Depends(get_cur
     ]
 
 
+MAX_RULE_POINTS = 1000
+
+
+def _check_points(points) -> int:
+    try:
+        points = int(points)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=422, detail="points must be an integer")
+    if abs(points) > MAX_RULE_POINTS:
+        raise HTTPException(status_code=422, detail=f"points must be between -{MAX_RULE_POINTS} and {MAX_RULE_POINTS}")
+    return points
+
+
 @router.post("/score/rules")
 def create_score_rule(payload: dict, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
     required = ["name", "field", "operator", "value", "points"]
@@ -243,13 +340,14 @@ def create_score_rule(payload: dict, db: Session = Depends(get_db), user: User =
         field=str(payload["field"]),
         operator=str(payload["operator"]),
         value=str(payload["value"]),
-        points=int(payload["points"]),
+        points=_check_points(payload["points"]),
         active=bool(payload.get("active", True)),
         tenant_id=user.tenant_id,
     )
     db.add(rule)
     db.commit()
     db.refresh(rule)
+    _enqueue_rule_rescore(user.tenant_id, rule)
     return {"ok": True, "id": rule.id}
 
 
@@ -263,11 +361,15 @@ def update_score_rule(rule_id: int, payload: dict, db: Session = Depends(get_db)
     if not rule:
         raise HTTPException(status_code=404, detail="Rule not found")
 
+    if "points" in payload:
+        payload["points"] = _check_points(payload["points"])
+    before = _rule_predicate_args(rule)
     for field in ["name", "field", "operator", "value", "points", "active"]:
         if field in payload:
             setattr(rule, field, payload[field])
 
     db.commit()
+    _enqueue_rule_rescore(user.tenant_id, rule, before)
     return {"ok": True, "id": rule.id}
 
 
@@ -281,129 +383,254 @@ def delete_score_rule(rule_id: int, db: Session = Depends(get_db), user: User =
     if not rule:
         raise HTTPException(status_code=404, detail="Rule not found")
 
+    before = _rule_predicate_args(rule)
     db.delete(rule)
     db.commit()
+    _enqueue_rule_rescore(user.tenant_id, None, before)
     return {"ok": True, "id": rule_id}
 
 
-@router.post("/score/recompute")
-def recompute_scores(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    rules = (
-        db.query(LeadScoreRule)
-        .filter(LeadScoreRule.active == True, LeadScoreRule.tenant_id == user.tenant_id)
-        .all()
-    )
-    leads = db.query(Lead).filter(Lead.tenant_id == user.tenant_id).all()
-    updated = 0
-    for lead in leads:
-        old = lead.score or 0
-        new_score = sum(_apply_rule(lead, r) for r in rules)
-        if new_score != old:
-            lead.score = new_score
-            db.add(
-                LeadEvent(
-                    lead_id=lead.id,
-                    event_type="score_recomputed",
-                    old_value=str(old),
-                    new_value=str(new_score),
-                    actor="system",
-                )
-            )
-            updated += 1
-    db.commit()
-    return {"ok": True, "updated": updated, "rules": len(rules)}
+class SimulationRule(BaseModel):
+    field: str
+    operator: str
+    value: str
+    points: int = Field(ge=-MAX_RULE_POINTS, le=MAX_RULE_POINTS)
+    active: bool = True
 
 
-@router.get("/sla")
-def get_sla(db: Session = Depends(get_db), user: User = Depends(get_current_user), threshold_sec: int = 300, limit: int = 50):
-    conversations = (
-        db.query(Conversation)
-        .filter(Conversation.tenant_id == user.tenant_id)
-        .order_by(Conversation.id.desc())
-        .limit(limit)
-        .all()
-    )
-    rows = []
-    for convo in conversations:
-        msgs = (
-            db.query(Message)
-            .filter(Message.conversation_id == convo.id, Message.tenant_id == user.tenant_id)
-            .order_by(Message.id.asc())
+class ScoreSimulationRequest(BaseModel):
+    rules: list[SimulationRule] = Field(max_length=200)
+    include_current: bool = False  # add the candidates on top of the active rules instead of replacing them
+    bin_width: int = Field(default=10, ge=1, le=1000)  # widened further if it would give more than MAX_BINS bins
+    top: int = Field(default=20, ge=1, le=500)
+
+
+@router.post("/score/simulate")
+def simulate_scores(req: ScoreSimulationRequest, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    rules = [r for r in req.rules if r.active]
+    if req.include_current:
+        rules += (
+            db.query(LeadScoreRule)
+            .filter(LeadScoreRule.active == True, LeadScoreRule.tenant_id == user.tenant_id)
             .all()
         )
-        first_user = next((m for m in msgs if m.role == "user"), None)
-        first_assistant = next(
-            (m for m in msgs if m.role == "assistant" and first_user and m.id > first_user.id), None
+    frame = load_lead_frame(db, user.tenant_id)
+    return {"rules": len(rules), **simulate(frame, rules, bin_width=req.bin_width, top=req.top)}
+
+
+@router.post("/score/recompute")
+def recompute_scores(
+    background: bool = False,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    if background:
+        func_name = "apps.worker.jobs.recompute_lead_scores"
+        job_id = enqueue_unique(
+            func_name, user.tenant_id, job_id=f"recompute_scores:{user.tenant_id}", job_timeout=3600
         )
-        if not first_user or not first_assistant:
-            continue
-        response_sec = (first_assistant.created_at - first_user.created_at).total_seconds()
-        rows.append(
-            {
-                "session_id": convo.session_id,
-                "contact_id": convo.contact_id,
-                "response_sec": response_sec,
-                "status": "met" if response_sec <= threshold_sec else "breached",
-                "first_user_at": first_user.created_at.isoformat(),
-                "first_assistant_at": first_assistant.created_at.isoformat(),
-            }
+        return {"ok": True, **_tenant_job_status(job_id, func_name, user.tenant_id)}
+
+    result = recompute_tenant_scores(db, user.tenant_id)
+    bump_versions(user.tenant_id, "leads")
+    return result
+
+
+def _tenant_job_status(job_id: str, func_name: str, tenant_id: int) -> dict:
+    try:
+        job = Job.fetch(job_id, connection=get_queue().connection)
+    except NoSuchJobError:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.func_name != func_name or job.args[:1] != (tenant_id,):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return {
+        "job_id": job.id,
+        "status": job.get_status(),
+        "progress": job.meta.get("progress"),
+        "result": job.result,
+    }
+
+
+@router.get("/score/recompute/{job_id}")
+def recompute_scores_status(job_id: str, user: User = Depends(get_current_user)):
+    return _tenant_job_status(job_id, "apps.worker.jobs.recompute_lead_scores", user.tenant_id)
+
+
+SLA_PERCENTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+def _response_sec():
+    return func.extract("epoch", Conversation.first_assistant_at - Conversation.first_user_at)
+
+
+@router.get("/sla")
+def get_sla(
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+    threshold_sec: int = 300,
+    limit: int = Query(default=50, ge=1, le=500),
+    cursor: int | None = None,
+    status: str | None = None,
+):
+    def _load():
+        response_sec = _response_sec()
+        sla_status = case((response_sec <= threshold_sec, "met"), else_="breached")
+
+        q = (
+            select(
+                Conversation.id,
+                Conversation.session_id,
+                Conversation.contact_id,
+                Conversation.channel,
+                Conversation.first_user_at,
+                Conversation.first_assistant_at,
+                response_sec.label("response_sec"),
+                sla_status.label("status"),
+            )
+            .where(Conversation.tenant_id == user.tenant_id, Conversation.first_assistant_at.is_not(None))
+            .order_by(Conversation.id.desc())
+            .limit(limit + 1)
+        )
+        if cursor is not None:
+            q = q.where(Conversation.id < cursor)
+        if status:
+            q = q.where(sla_status == status)
+
+        rows = db.execute(q).all()
+        page = rows[:limit]
+        return {
+            "items": [
+                {
+                    "session_id": r.session_id,
+                    "contact_id": r.contact_id,
+                    "channel": r.channel,
+                    "response_sec": float(r.response_sec),
+                    "status": r.status,
+                    "first_user_at": r.first_user_at.isoformat(),
+                    "first_assistant_at": r.first_assistant_at.isoformat(),
+                }
+                for r in page
+            ],
+            "next_cursor": page[-1].id if len(rows) > limit else None,
+        }
+
+    params = {"threshold_sec": threshold_sec, "limit": limit, "cursor": cursor, "status": status}
+    return cached(user.tenant_id, "sla", ["conversations"], _load, params=params)
+
+
+@router.get("/sla/latency")
+def get_sla_latency(
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+    threshold_sec: int = 300,
+    days: int = Query(default=30, ge=1, le=365),
+):
+    def _load():
+        response_sec = _response_sec()
+        day = cast(Conversation.first_user_at, Date)
+        since = datetime.utcnow() - timedelta(days=days)
+
+        # one pass over the indexed (tenant_id, first_user_at) range, grouped both ways at once
+        rows = db.execute(
+            select(
+                func.grouping(Conversation.channel).label("by_day"),
+                Conversation.channel,
+                day.label("day"),
+                func.count().label("conversations"),
+                func.count().filter(response_sec > threshold_sec).label("breached"),
+                func.percentile_cont(array(SLA_PERCENTILES)).within_group(response_sec).label("pcts"),
+            )
+            .where(
+                Conversation.tenant_id == user.tenant_id,
+                Conversation.first_user_at >= since,
+                Conversation.first_assistant_at.is_not(None),
+            )
+            .group_by(func.grouping_sets(Conversation.channel, day))
+        ).all()
+
+        def _stats(r) -> dict:
+            stats = {"conversations": r.conversations, "breached": r.breached}
+            for p, value in zip(SLA_PERCENTILES, r.pcts or []):
+                stats[f"p{int(p * 100)}"] = float(value) if value is not None else None
+            return stats
+
+        by_channel = [{"channel": r.channel, **_stats(r)} for r in rows if not r.by_day]
+        by_day = sorted(
+            ({"day": r.day.isoformat(), **_stats(r)} for r in rows if r.by_day),
+            key=lambda d: d["day"],
         )
-    return rows
+        return {"threshold_sec": threshold_sec, "days": days, "by_channel": by_channel, "by_day": by_day}
+
+    params = {"threshold_sec": threshold_sec, "days": days}
+    return cached(user.tenant_id, "sla_latency", ["conversations"], _load, params=params)
+
 
 @router.get("/leads")
 def list_leads(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    rows = (
-        db.query(Lead)
-        .filter(Lead.tenant_id == user.tenant_id)
-        .order_by(Lead.id.desc())
-        .limit(100)
-        .all()
-    )
-    return [
-        {
-            "id": r.id,
-            "contact_id": r.contact_id,
-            "status": r.status,
-            "score": r.score,
-            "summary": r.summary,
-        }
-        for r in rows
-    ]
+    def _load():
+        rows = (
+            db.query(Lead)
+            .filter(Lead.tenant_id == user.tenant_id)
+            .order_by(Lead.id.desc())
+            .limit(100)
+            .all()
+        )
+        return [
+            {
+                "id": r.id,
+                "contact_id": r.contact_id,
+                "status": r.status,
+                "score": r.score,
+                "summary": r.summary,
+            }
+            for r in rows
+        ]
+
+    return cached(user.tenant_id, "leads", ["leads"], _load)
+
 
 @router.get("/tickets")
 def list_tickets(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    rows = (
-        db.query(Ticket)
-        .filter(Ticket.tenant_id == user.tenant_id)
-        .order_by(Ticket.id.desc())
-        .limit(100)
-        .all()
-    )
-    return [
-        {
-            "id": r.id,
-            "contact_id": r.contact_id,
-            "status": r.status,
-            "priority": r.priority,
-            "category": r.category,
-            "tag": r.tag,
-            "sentiment": r.sentiment,
-            "urgency": r.urgency,
-            "summary": r.summary,
-        }
-        for r in rows
-    ]
+    def _load():
+        rows = (
+            db.query(Ticket)
+            .filter(Ticket.tenant_id == user.tenant_id)
+            .order_by(Ticket.id.desc())
+            .limit(100)
+            .all()
+        )
+        return [
+            {
+                "id": r.id,
+                "contact_id": r.contact_id,
+                "status": r.status,
+                "priority": r.priority,
+                "category": r.category,
+                "tag": r.tag,
+                "sentiment": r.sentiment,
+                "urgency": r.urgency,
+                "summary": r.summary,
+            }
+            for r in rows
+        ]
+
+    return cached(user.tenant_id, "tickets", ["tickets"], _load)
+
 
 @router.get("/contacts")
 def list_contacts(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    rows = (
-        db.query(Contact)
-        .filter(Contact.tenant_id == user.tenant_id)
-        .order_by(Contact.id.desc())
-        .limit(100)
-        .all()
-    )
-    return [{"id": c.id, "email": c.email, "name": c.name, "company": c.company} for c in rows]
+    def _load():
+        rows = (
+            db.query(Contact)
+            .filter(Contact.tenant_id == user.tenant_id)
+            .order_by(Contact.id.desc())
+            .limit(100)
+            .all()
+        )
+        return [{"id": c.id, "email": c.email, "name": c.name, "company": c.company} for c in rows]
+
+    return cached(user.tenant_id, "contacts", ["contacts"], _load)
 
 
 AUTO_ADVANCE_ON_APPROVE = {
@@ -485,14 +712,15 @@ def approve_draft(draft_id: int, db: Session = Depends(get_db), user: User = Dep
     # log "SENT" into conversation (simulation)
     if draft.conversation_id:
         convo = db.query(Conversation).filter(Conversation.id == draft.conversation_id).one()
-        db.add(
-            Message(
-                conversation_id=convo.id,
-                tenant_id=draft.tenant_id,
-                role="system",
-                content=f"APPROVED + SENT:\n\n{draft.content}",
-            )
+        sent = Message(
+            conversation_id=convo.id,
+            tenant_id=draft.tenant_id,
+            role="system",
+            content=f"APPROVED + SENT:\n\n{draft.content}",
+            created_at=datetime.utcnow(),
         )
+        db.add(sent)
+        convo.record_message(sent.role, sent.created_at)
 
     # auto-advance entity
     if draft.lead_id:
@@ -508,6 +736,7 @@ def approve_draft(draft_id: int, db: Session = Depends(get_db), user: User = Dep
             ticket.status = "open"  # or "in_progress"
 
     db.commit()
+    bump_versions(user.tenant_id, "drafts", "leads", "tickets", "conversations")
 
     return {"ok": True, "draft_id": draft.id, "status": draft.status}
 
@@ -526,7 +755,9 @@ def reject_draft(draft_id: int, db: Session = Depends(get_db), user: User = Depe
         raise HTTPException(status_code=400, detail=f"Draft is not pending (status={draft.status})")
 
     draft.status = "rejected"
+    draft.rejected_at = datetime.utcnow()
     db.commit()
+    bump_versions(user.tenant_id, "drafts")
     return {"ok": True, "draft_id": draft.id, "status": draft.status}
 
 
@@ -549,10 +780,167 @@ def update_draft(draft_id: int, payload: dict, db: Session = Depends(get_db), us
 
     draft.content = content
     db.commit()
+    bump_versions(user.tenant_id, "drafts")
     db.refresh(draft)
     return {"ok": True, "draft_id": draft.id, "status": draft.status, "content": draft.content}
 
 
+class TaxonomyLabel(BaseModel):
+    label: str = Field(min_length=1, max_length=100)
+    keywords: list[Annotated[str, Field(max_length=255)]] = Field(min_length=1)
+
+
+class TaxonomyDimensionRequest(BaseModel):
+    labels: list[TaxonomyLabel]  # priority order: the first label with a keyword hit wins
+
+
+# labels of these dimensions are stored on messages/tickets (and intent_daily_counts)
+TAXONOMY_LABEL_COLUMNS = {
+    "intent": Message.intent,
+    "tag": Ticket.tag,
+    "sentiment": Ticket.sentiment,
+    "urgency": Ticket.urgency,
+}
+# labels the chat flow and build_reply act on; anything else would never match
+TAXONOMY_FIXED_LABELS = {
+    "intent": {"lead", "ticket"},
+    "reply": {"services", "pricing"},
+}
+
+
+def _check_dimension(dimension: str) -> None:
+    if dimension not in TAXONOMY:
+        raise HTTPException(status_code=400, detail=f"Unknown dimension (expected one of {sorted(TAXONOMY)})")
+
+
+def _check_labels(dimension: str, labels: list[TaxonomyLabel]) -> None:
+    allowed = TAXONOMY_FIXED_LABELS.get(dimension)
+    column = TAXONOMY_LABEL_COLUMNS.get(dimension)
+    for entry in labels:
+        if allowed is not None and entry.label not in allowed:
+            raise HTTPException(
+                status_code=422, detail=f"{dimension} labels must be one of {sorted(allowed)}, got {entry.label!r}"
+            )
+        if column is not None and len(entry.label) > column.type.length:
+            raise HTTPException(
+                status_code=422,
+                detail=f"{dimension} labels are limited to {column.type.length} characters, got {entry.label!r}",
+            )
+        if not any(k.strip() for k in entry.keywords):
+            raise HTTPException(status_code=422, detail=f"{dimension} label {entry.label!r} has no non-blank keywords")
+
+
+@router.get("/taxonomy")
+def get_taxonomy(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    rows = (
+        db.query(TaxonomyKeyword)
+        .filter(TaxonomyKeyword.tenant_id == user.tenant_id)
+        .order_by(TaxonomyKeyword.id)
+        .all()
+    )
+    customised = {r.dimension for r in rows}
+    return {
+        dim: {
+            "source": "tenant" if dim in customised else "default",
+            "labels": [{"label": label, "keywords": keywords} for label, keywords in entries],
+        }
+        for dim, entries in tenant_taxonomy(rows).items()
+    }
+
+
+@router.put("/taxonomy/{dimension}")
+def replace_taxonomy_dimension(
+    dimension: str,
+    req: TaxonomyDimensionRequest,
+    db: Session = Depends(get_db),
+    user: User = Depends(require_admin),
+):
+    _check_dimension(dimension)
+    _check_labels(dimension, req.labels)
+    db.query(TaxonomyKeyword).filter(
+        TaxonomyKeyword.tenant_id == user.tenant_id, TaxonomyKeyword.dimension == dimension
+    ).delete(synchronize_session=False)
+    db.add_all(
+        TaxonomyKeyword(tenant_id=user.tenant_id, dimension=dimension, label=entry.label, rank=rank, keyword=keyword)
+        for rank, entry in enumerate(req.labels)
+        for keyword in {k.strip().lower() for k in entry.keywords if k.strip()}
+    )
+    bump_taxonomy_version(db, user.tenant_id)
+    db.commit()
+    return {"ok": True, "dimension": dimension, "labels": len(req.labels)}
+
+
+@router.delete("/taxonomy/{dimension}")
+def reset_taxonomy_dimension(dimension: str, db: Session = Depends(get_db), user: User = Depends(require_admin)):
+    """Drop the tenant's keywords for a dimension, falling back to the built-in lists."""
+    _check_dimension(dimension)
+    deleted = db.query(TaxonomyKeyword).filter(
+        TaxonomyKeyword.tenant_id == user.tenant_id, TaxonomyKeyword.dimension == dimension
+    ).delete(synchronize_session=False)
+    if deleted:
+        bump_taxonomy_version(db, user.tenant_id)
+    db.commit()
+    return {"ok": True, "dimension": dimension, "deleted": deleted}
+
+
+@router.get("/reply-cache")
+def get_reply_cache_stats(user: User = Depends(get_current_user)):
+    return reply_cache_stats(user.tenant_id)
+
+
+@router.get("/reply-cache/process")
+def get_reply_cache_process_stats(user: User = Depends(require_admin)):
+    # counters of this API process, summed over every tenant it served
+    return reply_cache_process_stats()
+
+
+@router.delete("/reply-cache")
+def clear_reply_cache(user: User = Depends(get_current_user)):
+    return {"ok": True, "deleted": clear_tenant(user.tenant_id)}
+
+
+@router.get("/llm-cache")
+def get_llm_cache_stats(user: User = Depends(require_admin)):
+    # provider response cache (core.llm.cache): shared by all tenants, counters are per process
+    return llm_cache_stats()
+
+
+@router.get("/llm-breaker")
+def get_llm_breaker(user: User = Depends(get_current_user)):
+    # circuit breaker in front of the LLM provider (core.llm.resilience), this process's view
+    return breaker_state()
+
+
+@router.post("/tickets/classify")
+def classify_tickets_bulk(
+    scope: str = Query(default="unclassified", pattern="^(unclassified|all)$"),
+    background: bool = True,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    only_unclassified = scope == "unclassified"
+    if background:
+        func_name = "apps.worker.jobs.reclassify_tickets"
+        job_id = enqueue_unique(
+            func_name,
+            user.tenant_id,
+            only_unclassified,
+            job_id=f"reclassify_tickets:{user.tenant_id}:{scope}",
+            job_timeout=3600,
+        )
+        return {"ok": True, **_tenant_job_status(job_id, func_name, user.tenant_id)}
+
+    result = reclassify_tenant_tickets(db, user.tenant_id, only_unclassified=only_unclassified)
+    if result["updated"]:
+        bump_versions(user.tenant_id, "tickets")
+    return result
+
+
+@router.get("/tickets/classify/{job_id}")
+def classify_tickets_bulk_status(job_id: str, user: User = Depends(get_current_user)):
+    return _tenant_job_status(job_id, "apps.worker.jobs.reclassify_tickets", user.tenant_id)
+
+
 @router.post("/tickets/{ticket_id}/classify")
 def classify_ticket_endpoint(ticket_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
     ticket = (
@@ -563,11 +951,12 @@ def classify_ticket_endpoint(ticket_id: int, db: Session = Depends(get_db), user
     if not ticket:
         raise HTTPException(status_code=404, detail="Ticket not found")
 
-    classification = classify_ticket(ticket.summary or "")
+    classification = classify_ticket(ticket.summary or "", get_classifier(db, user.tenant_id))
     ticket.tag = classification["tag"]
     ticket.sentiment = classification["sentiment"]
     ticket.urgency = classification["urgency"]
     db.commit()
+    bump_versions(user.tenant_id, "tickets")
     return {"ok": True, **classification}
 
 
@@ -581,5 +970,5 @@ def ticket_macros(ticket_id: int, db: Session = Depends(get_db), user: User = De
     if not ticket:
         raise HTTPException(status_code=404, detail="Ticket not found")
 
-    tag = ticket.tag or classify_ticket(ticket.summary or "")["tag"]
+    tag = ticket.tag or classify_ticket(ticket.summary or "", get_classifier(db, user.tenant_id))["tag"]
     return {"ticket_id": ticket.id, "tag": tag, "macros": suggested_macros(tag)}
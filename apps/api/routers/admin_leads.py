@@ -2,10 +2,12 @@ from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 
+from core.cache import bump_versions
 from core.db import get_db
 from apps.api.routers.auth import get_current_user
 from core.models.crm import User
 from core.models.crm import Lead, LeadEvent
+from core.scoring import rescore_lead
 
 router = APIRouter(prefix="/admin/leads", tags=["admin-leads"])
 
@@ -43,6 +45,9 @@ def update_lead(lead_id: int, req: LeadUpdateRequest, db: Session = Depends(get_
             )
         )
         lead.status = req.status
+        # an explicit score in the same request wins over the rule score
+        if req.score is None:
+            rescore_lead(db, lead)
 
     # score change event
     if req.score is not None and req.score != lead.score:
@@ -59,6 +64,7 @@ def update_lead(lead_id: int, req: LeadUpdateRequest, db: Session = Depends(get_
         lead.score = req.score
 
     db.commit()
+    bump_versions(user.tenant_id, "leads")
     db.refresh(lead)
 
     return {"id": lead.id, "status": lead.status, "score": lead.score}
@@ -1,17 +1,30 @@
+import asyncio
+import json
+from typing import AsyncIterator
+
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 from sqlalchemy import and_
 
-from core.db import get_db
-from apps.api.routers.auth import get_current_user
+from core.db import AsyncSessionLocal, get_async_db
+from apps.api.routers.auth import get_current_user_async
 from core.models.crm import User
-from core.queue import get_queue
-from core.models.crm import Conversation, Message, Contact, Lead, Ticket
-from apps.api.utils.replies import build_reply
-from apps.api.utils.support import classify_ticket
-from core.llm.client import generate_llm_reply
+from core.queue import aenqueue_jobs
+from core.models.crm import Message, Lead, Ticket
+from apps.api.utils.replies import HELPER_GREETING, REPLY_FINGERPRINT, build_reply, system_prompt_for
+from apps.api.utils.classifier import get_classifier
+from core.analytics import increment_intent_count
+from core.cache import abump_versions
+from core.scoring import rescore_lead
+from core.upserts import upsert_contact, upsert_conversation
+from core.llm.client import StreamInterrupted, agenerate_llm_reply, astream_llm_reply
+from core.llm.context import aconversation_context, ainvalidate_context
+from core.ratelimit import aadmit
+from core.reply_cache import aget_reply, aset_reply, reply_key
 
 router = APIRouter()
 
@@ -26,67 +39,108 @@ class ChatRequest(BaseModel):
     goal: str | None = None
 
 
-@router.post("")
-def chat(req: ChatRequest, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    session_id = req.session_id or "demo-session"
-    tenant_id = user.tenant_id
+async def _answer(
+    req: ChatRequest, labels: dict, tenant_id: int, history: list[dict], use_llm: bool = True
+) -> str:
+    """Assistant response: cached or fresh LLM reply, rule-based reply as fallback.
+
+    `history` is the session's earlier turns. With use_llm=False (request over the
+    chat budget) only a cached reply is served.
+    """
+    if req.source == "helper" and labels["greeting"]:
+        return HELPER_GREETING
+    system_prompt = system_prompt_for(req.source)
+    key = reply_key(tenant_id, req.message, system_prompt, REPLY_FINGERPRINT, history)
+    answer = await aget_reply(key) if key else None
+    if answer is None and use_llm:
+        answer = await agenerate_llm_reply(
+            req.message, system_override=system_prompt, tenant_id=tenant_id, history=history
+        )
+        if answer and key:
+            await aset_reply(key, answer)
+    return answer or build_reply(req.message, labels)
+
+
+async def _stream_answer(
+    req: ChatRequest, labels: dict, tenant_id: int, history: list[dict], use_llm: bool = True
+) -> AsyncIterator[str]:
+    """_answer() as chunks: a cached reply or the rule-based reply is a single chunk."""
+    if req.source == "helper" and labels["greeting"]:
+        yield HELPER_GREETING
+        return
+    system_prompt = system_prompt_for(req.source)
+    key = reply_key(tenant_id, req.message, system_prompt, REPLY_FINGERPRINT, history)
+    cached = await aget_reply(key) if key else None
+    if cached is not None:
+        yield cached
+        return
+    parts = []
+    if use_llm:
+        async for delta in astream_llm_reply(
+            req.message, system_override=system_prompt, tenant_id=tenant_id, history=history
+        ):
+            parts.append(delta)
+            yield delta
+    if not parts:
+        yield build_reply(req.message, labels)
+    elif key:
+        await aset_reply(key, "".join(parts))
 
-    # 1) get or create conversation
-    convo = (
-        db.query(Conversation)
-        .filter(Conversation.session_id == session_id, Conversation.tenant_id == tenant_id)
-        .one_or_none()
-    )
-    if convo is None:
-        convo = Conversation(session_id=session_id, channel="web", tenant_id=tenant_id)
-        db.add(convo)
-        db.commit()
-        db.refresh(convo)
 
-    # 2) UPSERT CONTACT + LINK TO CONVERSATION  ✅  (THIS IS WHERE IT GOES)
+def _record_chat(
+    db: Session,
+    tenant_id: int,
+    session_id: str,
+    req: ChatRequest,
+    labels: dict,
+    intent: str,
+    answer: str | None,
+    received_at: datetime,
+    answered_at: datetime | None,
+) -> dict:
+    """Every write of one chat turn, in the caller's transaction.
+
+    Contact and conversation are atomic upserts (no read-then-insert race on the
+    tenant unique indexes); messages and CRM objects go out in a single flush.
+    Returns the follow-up jobs to enqueue once the caller commits.
+    With answer=None the reply is deferred to the generate_chat_reply worker job.
+    """
     contact_id = None
     if req.email:
-        email = req.email.strip().lower()
-        contact = (
-            db.query(Contact)
-            .filter(Contact.email == email, Contact.tenant_id == tenant_id)
-            .one_or_none()
+        contact_id, _ = upsert_contact(
+            db, tenant_id, req.email.strip().lower(), name=req.name, company=req.company
         )
-        if contact is None:
-            contact = Contact(email=email, tenant_id=tenant_id)
-            db.add(contact)
-            db.commit()
-            db.refresh(contact)
-
-        convo.contact_id = contact.id
-        db.commit()
-        contact_id = contact.id
+    convo_id = upsert_conversation(
+        db, tenant_id, session_id, contact_id=contact_id, user_at=received_at, assistant_at=answered_at
+    )
 
-    # 3) store user message
     user_msg = Message(
-        conversation_id=convo.id,
+        conversation_id=convo_id,
         tenant_id=tenant_id,
         role="user",
         content=req.message,
+        intent=intent,
+        created_at=received_at,
     )
     db.add(user_msg)
-    db.commit()
-
-    # 4) rule-based triage
-    text = req.message.lower()
-    intent = "general"
-    if any(k in text for k in ["price", "pricing", "quote", "cost", "book", "demo", "buy", "service"]):
-        intent = "lead"
-    elif any(k in text for k in ["error", "bug", "issue", "not working", "problem", "help"]):
-        intent = "ticket"
-    if req.source == "lead_capture":
-        intent = "lead"
+    if answer is not None:
+        db.add(
+            Message(
+                conversation_id=convo_id,
+                tenant_id=tenant_id,
+                role="assistant",
+                content=answer,
+                reply_to=user_msg,
+                created_at=answered_at,
+            )
+        )
+    increment_intent_count(db, tenant_id, received_at.date(), intent)
 
     lead = None
     ticket = None
 
-    # Only create CRM objects if we have a contact_id
-    if contact_id:
+    # Only create CRM objects if we have a contact
+    if contact_id is not None:
         if intent == "lead":
             lead = Lead(
                 tenant_id=tenant_id,
@@ -95,64 +149,240 @@ def chat(req: ChatRequest, db: Session = Depends(get_db), user: User = Depends(g
                 score=50,
                 summary=req.message,
             )
+            rescore_lead(db, lead)
             db.add(lead)
-            db.commit()
-            db.refresh(lead)
-
-            # enqueue background job (RQ worker)
-            get_queue().enqueue("apps.worker.jobs.create_lead_followup_draft", lead.id)
 
         elif intent == "ticket":
-            classification = classify_ticket(req.message)
             ticket = Ticket(
                 tenant_id=tenant_id,
                 contact_id=contact_id,
                 priority="medium",
                 status="open",
                 category="general",
-                tag=classification["tag"],
-                sentiment=classification["sentiment"],
-                urgency=classification["urgency"],
+                tag=labels["tag"],
+                sentiment=labels["sentiment"],
+                urgency=labels["urgency"],
                 summary=req.message,
             )
             db.add(ticket)
-            db.commit()
-            db.refresh(ticket)
 
-            get_queue().enqueue("apps.worker.jobs.create_ticket_reply_draft", ticket.id)
+    db.flush()
+    # (job_id, func_name, args): ids are per object, so repeat triggers collapse at the queue
+    followups = []
+    if answer is None:
+        followups.append(
+            (f"chat_reply:{user_msg.id}", "apps.worker.jobs.generate_chat_reply", (user_msg.id, req.source))
+        )
+    if lead is not None:
+        followups.append((f"lead_followup:{lead.id}", "apps.worker.jobs.create_lead_followup_draft", (lead.id,)))
+    if ticket is not None:
+        followups.append((f"ticket_reply:{ticket.id}", "apps.worker.jobs.create_ticket_reply_draft", (ticket.id,)))
+    return {
+        "message_id": user_msg.id,
+        "contact_id": contact_id,
+        "followups": followups,
+        "entities": [
+            "conversations",
+            *(["contacts"] if contact_id is not None else []),
+            *(["leads"] if lead else []),
+            *(["tickets"] if ticket else []),
+        ],
+    }
 
 
-    # 5) assistant response (LLM with fallback)
-    if req.source == "helper":
-        text_l = req.message.lower()
-        if any(greet in text_l for greet in ["hi", "hello", "hey", "good morning", "good evening"]):
-            answer = (
-                "Hi there! We help teams with CRM setup, integrations, automation, and support workflows. "
-                "What are you trying to improve right now?"
-            )
-        else:
-            helper_prompt = (
-                "You are a business-focused chatbot for a ClientOps company. "
-                "You may also answer basic general questions that help users understand CRM, automation, integrations, "
-                "and support workflows at a high level. Avoid unrelated topics. "
-                "Keep replies concise (3-6 sentences) and ask exactly one clarifying question."
-            )
-            answer = generate_llm_reply(req.message, system_override=helper_prompt) or build_reply(req.message)
-    else:
-        answer = generate_llm_reply(req.message) or build_reply(req.message)
-    assistant_msg = Message(
-        conversation_id=convo.id,
-        tenant_id=tenant_id,
-        role="assistant",
-        content=answer,
+async def _triage(
+    db: AsyncSession, tenant_id: int, session_id: str, req: ChatRequest
+) -> tuple[dict, str, list[dict]]:
+    """Rule-based triage: one classifier pass, reused for tickets and the fallback reply.
+
+    Also loads the session's recent turns for the prompt. Ends the read transaction,
+    so no pooled connection is held while the caller waits on the model.
+    """
+    history = await aconversation_context(db, tenant_id, session_id)
+    classifier = await db.run_sync(get_classifier, tenant_id)
+    labels = classifier.classify(req.message)
+    intent = labels["intent"]
+    if req.source == "lead_capture":
+        intent = "lead"
+    await db.commit()
+    return labels, intent, history
+
+
+async def _persist_turn(
+    db: AsyncSession,
+    tenant_id: int,
+    session_id: str,
+    req: ChatRequest,
+    labels: dict,
+    intent: str,
+    answer: str | None,
+    received_at: datetime,
+    answered_at: datetime | None,
+) -> dict:
+    # every write is one transaction, run through the sync ORM helpers
+    turn = await db.run_sync(
+        _record_chat, tenant_id, session_id, req, labels, intent, answer, received_at, answered_at
     )
-    db.add(assistant_msg)
-    db.commit()
+    await db.commit()
+
+    # background jobs (RQ worker) only after commit, so they never miss the rows
+    await aenqueue_jobs(turn["followups"])
+    await ainvalidate_context(tenant_id, session_id)
+    await abump_versions(tenant_id, *turn["entities"])
+    return turn
+
+
+def _triage_payload(intent: str) -> dict:
+    return {"intent": intent, "confidence": 0.6 if intent != "general" else 0.3}
+
+
+@router.post("")
+async def chat(
+    req: ChatRequest,
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(get_current_user_async),
+):
+    session_id = req.session_id or "demo-session"
+    tenant_id = user.tenant_id
+    received_at = datetime.utcnow()
+
+    labels, intent, history = await _triage(db, tenant_id, session_id, req)
+    answer = await _answer(req, labels, tenant_id, history, use_llm=await aadmit("chat", tenant_id))
+    answered_at = datetime.utcnow()
+    turn = await _persist_turn(db, tenant_id, session_id, req, labels, intent, answer, received_at, answered_at)
 
     return {
         "session_id": session_id,
         "answer": answer,
         "citations": [],
-        "triage": {"intent": intent, "confidence": 0.6 if intent != "general" else 0.3},
-        "contact_id": contact_id,
+        "triage": _triage_payload(intent),
+        "contact_id": turn["contact_id"],
     }
+
+
+@router.post("/deferred", status_code=202)
+async def chat_deferred(
+    req: ChatRequest,
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(get_current_user_async),
+):
+    """Accept a message without waiting on the model.
+
+    The user message, triage and CRM objects are committed as in POST /chat and the
+    reply is generated by the generate_chat_reply worker job. Collect it with
+    GET /conversations/{session_id}?after_id=<message_id>&wait=<seconds>.
+    Over the tenant's chat budget no job is queued: the turn is answered inline
+    without the model and returned with status "answered".
+    """
+    session_id = req.session_id or "demo-session"
+    tenant_id = user.tenant_id
+    received_at = datetime.utcnow()
+
+    labels, intent, history = await _triage(db, tenant_id, session_id, req)
+    answer = answered_at = None
+    if not await aadmit("chat", tenant_id):
+        answer = await _answer(req, labels, tenant_id, history, use_llm=False)
+        answered_at = datetime.utcnow()
+    turn = await _persist_turn(db, tenant_id, session_id, req, labels, intent, answer, received_at, answered_at)
+
+    payload = {
+        "session_id": session_id,
+        "message_id": turn["message_id"],
+        "status": "pending" if answer is None else "answered",
+        "triage": _triage_payload(intent),
+        "contact_id": turn["contact_id"],
+    }
+    if answer is not None:
+        payload["answer"] = answer
+    return payload
+
+
+# strong references to shielded writes that outlive their (cancelled) request
+_background_tasks: set[asyncio.Task] = set()
+
+
+def _spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+async def _persist_streamed_turn(
+    tenant_id: int,
+    session_id: str,
+    req: ChatRequest,
+    labels: dict,
+    intent: str,
+    answer: str | None,
+    received_at: datetime,
+    answered_at: datetime | None,
+) -> dict:
+    # request-scoped dependencies are closed before a streaming body runs
+    async with AsyncSessionLocal() as write_db:
+        return await _persist_turn(
+            write_db, tenant_id, session_id, req, labels, intent, answer, received_at, answered_at
+        )
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/stream")
+async def chat_stream(
+    req: ChatRequest,
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(get_current_user_async),
+):
+    """Same turn as POST /chat, with the reply streamed as Server-Sent Events.
+
+    Events: `meta` (session and triage, sent before the model is called), one
+    `delta` per chunk of reply text, then `done` once the assistant message and
+    CRM objects are committed. Without an LLM, or over the chat budget, the
+    build_reply text is one delta. If the model fails mid-reply, `done` carries
+    the build_reply text with `interrupted: true`. A client that disconnects still
+    gets its turn recorded; the reply then comes from the worker.
+    """
+    session_id = req.session_id or "demo-session"
+    tenant_id = user.tenant_id
+    received_at = datetime.utcnow()
+    labels, intent, history = await _triage(db, tenant_id, session_id, req)
+    use_llm = await aadmit("chat", tenant_id)
+
+    async def events() -> AsyncIterator[str]:
+        yield _sse("meta", {"session_id": session_id, "triage": _triage_payload(intent)})
+        parts = []
+        answer = answered_at = None
+        interrupted = False
+        try:
+            try:
+                async for chunk in _stream_answer(req, labels, tenant_id, history, use_llm):
+                    parts.append(chunk)
+                    yield _sse("delta", {"text": chunk})
+                answer = "".join(parts)
+            except StreamInterrupted:
+                # don't store the truncated text as the reply
+                interrupted = True
+                answer = build_reply(req.message, labels)
+            answered_at = datetime.utcnow()
+        finally:
+            # Also runs when the client disconnects mid-stream: the turn is still
+            # written, with answer=None so the generate_chat_reply job answers it.
+            # Shielded, so the cancellation of this response can't abort the write.
+            persisting = _spawn(
+                _persist_streamed_turn(
+                    tenant_id, session_id, req, labels, intent, answer, received_at, answered_at
+                )
+            )
+            turn = await asyncio.shield(persisting)
+        done = {"session_id": session_id, "contact_id": turn["contact_id"], "answer": answer}
+        if interrupted:
+            done["interrupted"] = True  # `answer` replaces the partial deltas
+        yield _sse("done", done)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,32 +1,66 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+import time
 
-from core.db import get_db
-from apps.api.routers.auth import get_current_user
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.db import get_async_db
+from apps.api.routers.auth import get_current_user_async
 from core.models.crm import User
 from core.models.crm import Conversation, Message
+from core.notify import conversation_updates
 
 router = APIRouter()
 
-@router.get("/{session_id}")
-def get_conversation(session_id: str, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+
+async def _load(db: AsyncSession, tenant_id: int, session_id: str, after_id: int | None):
     convo = (
-        db.query(Conversation)
-        .filter(Conversation.session_id == session_id, Conversation.tenant_id == user.tenant_id)
-        .one_or_none()
-    )
+        await db.execute(
+            select(Conversation).where(Conversation.session_id == session_id, Conversation.tenant_id == tenant_id)
+        )
+    ).scalar_one_or_none()
     if convo is None:
-        return {"session_id": session_id, "conversation_id": None, "messages": []}
+        return None, []
+
+    q = select(Message).where(Message.conversation_id == convo.id, Message.tenant_id == tenant_id)
+    if after_id is not None:
+        q = q.where(Message.id > after_id)
+    msgs = (await db.execute(q.order_by(Message.id.asc()))).scalars().all()
+    return convo, msgs
+
 
-    msgs = (
-        db.query(Message)
-        .filter(Message.conversation_id == convo.id, Message.tenant_id == user.tenant_id)
-        .order_by(Message.id.asc())
-        .all()
-    )
+@router.get("/{session_id}")
+async def get_conversation(
+    session_id: str,
+    after_id: int | None = None,
+    wait: float = Query(default=0, ge=0, le=30),
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(get_current_user_async),
+):
+    """Messages of a session, optionally only those after `after_id`.
+
+    With `wait` > 0 this is a long-poll: it returns as soon as an assistant message
+    newer than after_id exists (e.g. a reply to POST /chat/deferred), or after `wait`
+    seconds with whatever is there.
+    """
+    if wait <= 0:
+        convo, msgs = await _load(db, user.tenant_id, session_id, after_id)
+    else:
+        deadline = time.monotonic() + wait
+        async with conversation_updates(user.tenant_id, session_id) as updates:
+            while True:
+                convo, msgs = await _load(db, user.tenant_id, session_id, after_id)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or any(m.role == "assistant" for m in msgs):
+                    break
+                await db.commit()  # release the connection while waiting
+                await updates.wait(remaining)
+
+    if convo is None:
+        return {"session_id": session_id, "conversation_id": None, "messages": []}
 
     return {
         "session_id": session_id,
         "conversation_id": convo.id,
-        "messages": [{"role": m.role, "content": m.content} for m in msgs],
+        "messages": [{"id": m.id, "role": m.role, "content": m.content} for m in msgs],
     }
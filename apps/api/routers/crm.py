@@ -1,16 +1,26 @@
 from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
 from apps.api.routers.auth import get_current_user
 from pydantic import BaseModel
 
+from core import upserts
+from core.cache import bump_versions
+from core.db import get_db
+from core.models.crm import User
+
 router = APIRouter()
 
 class ContactUpsert(BaseModel):
     email: str
     name: str | None = None
     company: str | None = None
-    notes: str | None = None
+    notes: str | None = None  # accepted for compatibility; contacts have no notes column
 
 @router.post("/contacts/upsert")
-def upsert_contact(payload: ContactUpsert, user=Depends(get_current_user)):
-    # Day 6: integrate HubSpot OR internal CRM tables
-    return {"status": "queued", "payload": payload.model_dump(), "next": "Day 6: persist + integrate"}
+def upsert_contact(payload: ContactUpsert, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    contact_id, created = upserts.upsert_contact(
+        db, user.tenant_id, payload.email.strip().lower(), name=payload.name, company=payload.company
+    )
+    db.commit()
+    bump_versions(user.tenant_id, "contacts")
+    return {"ok": True, "contact_id": contact_id, "created": created}
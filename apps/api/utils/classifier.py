@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import defaultdict
+from typing import Iterable
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from apps.api.data.service_catalog import SERVICE_CATALOG
+from core.automaton import build_automaton
+from core.config import settings
+from core.models.crm import TaxonomyKeyword, Tenant
+
+# Built-in taxonomy, used for every dimension a tenant has not customised.
+# dimension -> [(label, keywords)] in priority order: the first label with any hit wins
+TAXONOMY: dict[str, list[tuple[str, list[str]]]] = {
+    "intent": [
+        ("lead", ["price", "pricing", "quote", "cost", "book", "demo", "buy", "service"]),
+        ("ticket", ["error", "bug", "issue", "not working", "problem", "help"]),
+    ],
+    "tag": [
+        ("billing", ["billing", "invoice", "refund", "charge", "payment"]),
+        ("integration", ["integration", "api", "webhook", "sync"]),
+        ("access", ["login", "access", "password", "2fa", "auth"]),
+        ("performance", ["slow", "latency", "performance", "timeout"]),
+        ("bug", ["bug", "error", "issue", "broken", "crash", "500"]),
+    ],
+    "sentiment": [
+        ("negative", ["angry", "frustrated", "upset", "terrible", "unacceptable"]),
+        ("positive", ["thanks", "appreciate", "great", "love"]),
+    ],
+    "urgency": [
+        ("high", ["urgent", "asap", "down", "outage", "can't", "cannot", "blocked"]),
+        ("medium", ["soon", "today", "quick"]),
+    ],
+    "topic": [(svc["name"], svc["keywords"]) for svc in SERVICE_CATALOG["services"]],
+    # canned-reply routing used by build_reply and the helper widget
+    "reply": [
+        ("services", ["service", "services"]),
+        ("pricing", ["price", "pricing", "cost", "quote"]),
+    ],
+    "greeting": [("greeting", ["hi", "hello", "hey", "good morning", "good evening"])],
+}
+
+DEFAULTS: dict[str, str | None] = {
+    "intent": "general",
+    "tag": "general",
+    "sentiment": "neutral",
+    "urgency": "low",
+    "topic": "General",
+    "reply": None,
+    "greeting": None,
+}
+
+
+class KeywordClassifier:
+    """Every keyword of every dimension in one automaton; classify() is a single pass."""
+
+    def __init__(self, taxonomy: dict[str, list[tuple[str, list[str]]]], defaults: dict[str, str | None]):
+        self.defaults = dict(defaults)
+        self._labels: dict[str, list[str]] = {}
+        self._hits: dict[str, list[tuple[str, int]]] = defaultdict(list)  # keyword -> [(dimension, rank)]
+        for dim, entries in taxonomy.items():
+            self._labels[dim] = [label for label, _ in entries]
+            for rank, (_, keywords) in enumerate(entries):
+                for keyword in keywords:
+                    keyword = keyword.lower()
+                    if keyword:
+                        self._hits[keyword].append((dim, rank))
+        self._automaton = build_automaton(self._hits) if self._hits else None
+
+    def classify(self, text: str | None) -> dict[str, str | None]:
+        best: dict[str, int] = {}
+        if self._automaton is not None and text:
+            for keyword in self._automaton.matches(text.lower()):
+                for dim, rank in self._hits[keyword]:
+                    if rank < best.get(dim, rank + 1):
+                        best[dim] = rank
+        return {
+            dim: labels[best[dim]] if dim in best else self.defaults.get(dim)
+            for dim, labels in self._labels.items()
+        }
+
+
+_default_classifier = KeywordClassifier(TAXONOMY, DEFAULTS)
+
+
+def classify(text: str | None) -> dict[str, str | None]:
+    """All labels (intent, tag, sentiment, urgency, topic, reply, greeting) for one message."""
+    return _default_classifier.classify(text)
+
+
+def tenant_taxonomy(rows: Iterable[TaxonomyKeyword]) -> dict[str, list[tuple[str, list[str]]]]:
+    """Built-in taxonomy with each dimension the tenant has rows for replaced by those rows."""
+    custom: dict[str, dict[str, tuple[int, list[str]]]] = defaultdict(dict)
+    for row in rows:
+        rank, keywords = custom[row.dimension].setdefault(row.label, (row.rank, []))
+        keywords.append(row.keyword)
+    taxonomy = dict(TAXONOMY)
+    for dim, labels in custom.items():
+        ordered = sorted(labels.items(), key=lambda item: item[1][0])
+        taxonomy[dim] = [(label, keywords) for label, (_, keywords) in ordered]
+    return taxonomy
+
+
+# tenant_id -> (taxonomy_version, last version check, compiled classifier)
+_classifiers: dict[int, tuple[int, float, KeywordClassifier]] = {}
+_classifiers_lock = threading.Lock()
+
+
+def get_classifier(db: Session, tenant_id: int | None) -> KeywordClassifier:
+    """Compiled classifier for the tenant's taxonomy.
+
+    The tenant's taxonomy_version is re-read at most every settings.taxonomy_poll_sec,
+    and keywords are only reloaded and recompiled when it has moved, so edits made
+    in any process reach every API and worker process within one poll interval.
+    """
+    if tenant_id is None:
+        return _default_classifier
+    now = time.monotonic()
+    with _classifiers_lock:
+        hit = _classifiers.get(tenant_id)
+    if hit is not None and now - hit[1] < settings.taxonomy_poll_sec:
+        return hit[2]
+
+    version = db.execute(select(Tenant.taxonomy_version).where(Tenant.id == tenant_id)).scalar() or 0
+    if hit is not None and hit[0] == version:
+        classifier = hit[2]
+    elif version == 0:
+        classifier = _default_classifier  # never customised
+    else:
+        rows = db.execute(
+            select(TaxonomyKeyword).where(TaxonomyKeyword.tenant_id == tenant_id).order_by(TaxonomyKeyword.id)
+        ).scalars().all()
+        classifier = KeywordClassifier(tenant_taxonomy(rows), DEFAULTS)
+    with _classifiers_lock:
+        _classifiers[tenant_id] = (version, now, classifier)
+    return classifier
+
+
+def bump_taxonomy_version(db: Session, tenant_id: int) -> None:
+    """Mark the tenant's taxonomy as changed; joins the caller's transaction."""
+    db.execute(
+        update(Tenant).where(Tenant.id == tenant_id).values(taxonomy_version=Tenant.taxonomy_version + 1)
+    )
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+from typing import Callable
+
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.orm import Session
+
+from apps.api.utils.classifier import get_classifier
+from apps.api.utils.support import classify_ticket
+from core.models.crm import Ticket
+
+RECLASSIFY_BATCH = 2000
+CLASSIFIED_FIELDS = ("tag", "sentiment", "urgency")
+
+
+def reclassify_tenant_tickets(
+    db: Session,
+    tenant_id: int,
+    only_unclassified: bool = True,
+    batch_size: int = RECLASSIFY_BATCH,
+    on_progress: Callable[[int, int, int], None] | None = None,
+) -> dict:
+    """Classify a tenant's tickets in bulk and write back only rows whose labels changed.
+
+    Tickets are streamed from a server-side cursor on a dedicated connection, so the
+    writes below can commit once per batch without closing it. Each batch is one
+    executemany UPDATE keyed by id, labelled with the tenant's taxonomy as of the
+    start of the run. on_progress(done, total, updated) runs after each commit.
+    """
+    filters = [Ticket.tenant_id == tenant_id]
+    if only_unclassified:
+        filters.append(or_(*(getattr(Ticket, f).is_(None) for f in CLASSIFIED_FIELDS)))
+
+    total = db.execute(select(func.count()).select_from(Ticket).where(*filters)).scalar()
+    stmt = (
+        select(Ticket.id, Ticket.summary, Ticket.tag, Ticket.sentiment, Ticket.urgency)
+        .where(*filters)
+        .order_by(Ticket.id)
+    )
+
+    classifier = get_classifier(db, tenant_id)
+    done = updated = 0
+    with db.get_bind().connect() as reader:
+        result = reader.execution_options(stream_results=True, yield_per=batch_size).execute(stmt)
+        for rows in result.partitions():
+            changes = []
+            for row in rows:
+                labels = classify_ticket(row.summary or "", classifier)
+                if any(labels[f] != getattr(row, f) for f in CLASSIFIED_FIELDS):
+                    changes.append({"id": row.id, **labels})
+            if changes:
+                db.execute(update(Ticket), changes)
+            db.commit()
+            done += len(rows)
+            updated += len(changes)
+            if on_progress is not None:
+                on_progress(done, total, updated)
+
+    return {"ok": True, "processed": done, "updated": updated, "total": total}
@@ -1,17 +1,37 @@
+import hashlib
+import json
+
 from apps.api.data.service_catalog import SERVICE_CATALOG
+from apps.api.utils.classifier import classify
+from core.llm.client import CHAT_SYSTEM_PROMPT, generate_llm_reply
+from core.reply_cache import get_reply, reply_key, set_reply
+
+HELPER_GREETING = (
+    "Hi there! We help teams with CRM setup, integrations, automation, and support workflows. "
+    "What are you trying to improve right now?"
+)
+HELPER_PROMPT = (
+    "You are a business-focused chatbot for a ClientOps company. "
+    "You may also answer basic general questions that help users understand CRM, automation, integrations, "
+    "and support workflows at a high level. Avoid unrelated topics. "
+    "Keep replies concise (3-6 sentences) and ask exactly one clarifying question."
+)
+
+# cached LLM replies are keyed on this, so editing the catalog or any prompt invalidates them
+REPLY_FINGERPRINT = hashlib.sha1(
+    json.dumps([SERVICE_CATALOG, CHAT_SYSTEM_PROMPT, HELPER_PROMPT, HELPER_GREETING], sort_keys=True).encode()
+).hexdigest()
 
 def detect_topic(message: str) -> str:
-    text = (message or "").lower()
-    for svc in SERVICE_CATALOG["services"]:
-        if any(k in text for k in svc["keywords"]):
-            return svc["name"]
-    return "General"
-
-def build_reply(message: str) -> str:
-    topic = detect_topic(message)
+    return classify(message)["topic"]
+
+def build_reply(message: str, labels: dict | None = None) -> str:
+    """`labels` is classify(message) when the caller already has it."""
+    labels = labels or classify(message)
+    topic = labels["topic"]
     services = SERVICE_CATALOG["services"]
 
-    if "service" in (message or "").lower() or "services" in (message or "").lower():
+    if labels["reply"] == "services":
         bullets = "\n".join([f"- **{s['name']}** — {s['description']}" for s in services])
         return (
             "Here’s what we can help with:\n\n"
@@ -19,7 +39,7 @@ def build_reply(message: str) -> str:
             "If you tell me which CRM you use and what you’re trying to achieve, I’ll suggest the best next step."
         )
 
-    if any(x in (message or "").lower() for x in ["price", "pricing", "cost", "quote"]):
+    if labels["reply"] == "pricing":
         return (
             f"{SERVICE_CATALOG['pricing_note']}\n\n"
             "Quick questions:\n"
@@ -37,4 +57,30 @@ def build_reply(message: str) -> str:
             "Tell me your CRM + what tools you want connected, and I’ll outline a clean approach."
         )
 
-    return "Got it. Tell me what you’re trying to do (CRM, automation, integrations, or support) and I’ll guide you."
\ No newline at end of file
+    return "Got it. Tell me what you’re trying to do (CRM, automation, integrations, or support) and I’ll guide you."
+
+def system_prompt_for(source: str | None) -> str:
+    return HELPER_PROMPT if source == "helper" else CHAT_SYSTEM_PROMPT
+
+
+def compose_reply(
+    message: str,
+    labels: dict,
+    source: str | None = None,
+    tenant_id: int | None = None,
+    history: list[dict] | None = None,
+) -> str:
+    """Assistant response: cached or fresh LLM reply, rule-based reply as fallback (blocking).
+
+    `history` is the conversation so far, from core.llm.context.
+    """
+    if source == "helper" and labels["greeting"]:
+        return HELPER_GREETING
+    system_prompt = system_prompt_for(source)
+    key = reply_key(tenant_id, message, system_prompt, REPLY_FINGERPRINT, history)
+    answer = get_reply(key) if key else None
+    if answer is None:
+        answer = generate_llm_reply(message, system_override=system_prompt, tenant_id=tenant_id, history=history)
+        if answer and key:
+            set_reply(key, answer)
+    return answer or build_reply(message, labels)
@@ -2,38 +2,16 @@ from __future__ import annotations
 
 from typing import List
 
+from apps.api.utils.classifier import KeywordClassifier, classify
 
-def classify_ticket(text: str) -> dict:
-    t = (text or "").lower()
 
-    if any(k in t for k in ["billing", "invoice", "refund", "charge", "payment"]):
-        tag = "billing"
-    elif any(k in t for k in ["integration", "api", "webhook", "sync"]):
-        tag = "integration"
-    elif any(k in t for k in ["login", "access", "password", "2fa", "auth"]):
-        tag = "access"
-    elif any(k in t for k in ["slow", "latency", "performance", "timeout"]):
-        tag = "performance"
-    elif any(k in t for k in ["bug", "error", "issue", "broken", "crash", "500"]):
-        tag = "bug"
-    else:
-        tag = "general"
+def classify_intent(text: str, classifier: KeywordClassifier | None = None) -> str:
+    return (classifier.classify(text) if classifier else classify(text))["intent"]
 
-    if any(k in t for k in ["angry", "frustrated", "upset", "terrible", "unacceptable"]):
-        sentiment = "negative"
-    elif any(k in t for k in ["thanks", "appreciate", "great", "love"]):
-        sentiment = "positive"
-    else:
-        sentiment = "neutral"
 
-    if any(k in t for k in ["urgent", "asap", "down", "outage", "can't", "cannot", "blocked"]):
-        urgency = "high"
-    elif any(k in t for k in ["soon", "today", "quick"]):
-        urgency = "medium"
-    else:
-        urgency = "low"
-
-    return {"tag": tag, "sentiment": sentiment, "urgency": urgency}
+def classify_ticket(text: str, classifier: KeywordClassifier | None = None) -> dict:
+    labels = classifier.classify(text) if classifier else classify(text)
+    return {"tag": labels["tag"], "sentiment": labels["sentiment"], "urgency": labels["urgency"]}
 
 
 def suggested_macros(tag: str) -> List[str]:
@@ -396,6 +396,19 @@ if page == "Overview":
         avg_sec = metrics.get("avg_response_sec")
         st.metric("", f"{avg_sec:.1f}s" if isinstance(avg_sec, (int, float)) else "—")
 
+    st.markdown("<div class='section-title'>Activity</div>", unsafe_allow_html=True)
+    ts_days = st.selectbox("Range", [1, 7, 30, 90], index=1, format_func=lambda d: f"Last {d} days")
+    timeseries = safe_get_json(
+        f"{API_URL}/admin/metrics/timeseries?days={ts_days}&bucket={'hour' if ts_days <= 7 else 'day'}"
+    ) or []
+    df_ts = pd.DataFrame(timeseries)
+    if df_ts.empty:
+        st.caption("No activity rolled up yet.")
+    else:
+        df_ts["ts"] = pd.to_datetime(df_ts["ts"])
+        st.line_chart(df_ts, x="ts", y=["messages", "leads_created", "tickets_created"], height=220)
+        st.line_chart(df_ts, x="ts", y=["drafts_created", "drafts_approved", "drafts_rejected"], height=180)
+
     st.markdown("<div class='section-title'>Intent distribution</div>", unsafe_allow_html=True)
     intent = safe_get_json(f"{API_URL}/admin/intent") or {"lead": 0, "ticket": 0, "general": 0}
     intent_df = pd.DataFrame(
@@ -795,6 +808,7 @@ if page == "Admin":
                         st.rerun()
 
         st.markdown("#### Recompute scores")
+        st.caption("Scores update automatically when rules or lead status change. Use this as a full repair.")
         if st.button("Recompute all lead scores"):
             res = safe_post_json(f"{API_URL}/admin/score/recompute", {})
             if res is not None:
@@ -803,8 +817,17 @@ if page == "Admin":
     with admin_tabs[4]:
         st.markdown("<div class='section-title'>SLA Tracking</div>", unsafe_allow_html=True)
         threshold = st.slider("SLA threshold (seconds)", min_value=60, max_value=1200, value=300, step=30)
-        sla = safe_get_json(f"{API_URL}/admin/sla?threshold_sec={threshold}") or []
-        df_sla = pd.DataFrame(sla)
+        latency = safe_get_json(f"{API_URL}/admin/sla/latency?threshold_sec={threshold}") or {}
+        df_latency = pd.DataFrame(latency.get("by_channel", []))
+        if not df_latency.empty:
+            st.markdown("#### First-response latency (seconds, last 30 days)")
+            st.dataframe(df_latency, use_container_width=True, hide_index=True)
+            df_latency_day = pd.DataFrame(latency.get("by_day", []))
+            if not df_latency_day.empty:
+                st.line_chart(df_latency_day, x="day", y=["p50", "p90", "p95", "p99"], height=220)
+
+        sla = safe_get_json(f"{API_URL}/admin/sla?threshold_sec={threshold}") or {}
+        df_sla = pd.DataFrame(sla.get("items", []))
         if df_sla.empty:
             st.info("No SLA data yet.")
         else:
@@ -1,11 +1,24 @@
-from datetime import datetime, timedelta
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+from apps.api.utils.classifier import get_classifier
+from apps.api.utils.reclassify import reclassify_tenant_tickets
+from apps.api.utils.replies import compose_reply
+from core.analytics import rollup_metrics
+from core.cache import bump_versions
 from core.db import SessionLocal
 from core.models.crm import Lead, Ticket, AutomationDraft, Conversation, Message
 from core.llm.client import generate_llm_draft
+from core.llm.context import conversation_context, format_transcript, invalidate_context
+from core.notify import notify_conversation
+from core.queue import get_queue
+from core.scoring import recompute_tenant_scores
+from rq import get_current_job
 
 DRAFT_DEDUP_WINDOW_MIN = 10
+ROLLUP_INTERVAL_SEC = 300
 
 def _recent_pending_draft_exists(db: Session, *, kind: str, lead_id: int | None = None, ticket_id: int | None = None) -> bool:
     since = datetime.utcnow() - timedelta(minutes=DRAFT_DEDUP_WINDOW_MIN)
@@ -21,6 +34,49 @@ def _recent_pending_draft_exists(db: Session, *, kind: str, lead_id: int | None
     return db.query(q.exists()).scalar()
 
 
+def generate_chat_reply(message_id: int, source: str | None = None):
+    """Assistant reply for a message accepted by POST /chat/deferred."""
+    with SessionLocal() as db:
+        msg = db.query(Message).filter(Message.id == message_id, Message.role == "user").one_or_none()
+        if msg is None:
+            return {"ok": False, "error": "Message not found", "message_id": message_id}
+        if db.query(db.query(Message).filter(Message.reply_to_id == msg.id).exists()).scalar():
+            return {"ok": True, "skipped": True, "reason": "already answered"}
+
+        tenant_id, conversation_id, content = msg.tenant_id, msg.conversation_id, msg.content
+        session_id = db.get(Conversation, conversation_id).session_id
+        labels = get_classifier(db, tenant_id).classify(content)
+        history = conversation_context(db, tenant_id, session_id, before_id=message_id)
+        db.rollback()  # don't sit idle in a transaction while the model runs
+
+        answer = compose_reply(content, labels, source, tenant_id, history)
+
+        convo = db.get(Conversation, conversation_id)
+        reply = Message(
+            conversation_id=conversation_id,
+            tenant_id=tenant_id,
+            role="assistant",
+            content=answer,
+            reply_to_id=message_id,
+            created_at=datetime.utcnow(),
+        )
+        db.add(reply)
+        convo.record_message(reply.role, reply.created_at)
+        try:
+            db.flush()
+        except IntegrityError:
+            # another run answered the message while this one waited on the model
+            db.rollback()
+            return {"ok": True, "skipped": True, "reason": "already answered"}
+        reply_id = reply.id
+        db.commit()
+
+    invalidate_context(tenant_id, session_id)
+    bump_versions(tenant_id, "conversations")
+    notify_conversation(tenant_id, session_id)
+    return {"ok": True, "message_id": message_id, "reply_id": reply_id}
+
+
 def create_lead_followup_draft(lead_id: int):
     with SessionLocal() as db:
         lead = db.query(Lead).filter(Lead.id == lead_id).one_or_none()
@@ -37,7 +93,15 @@ def create_lead_followup_draft(lead_id: int):
             .first()
         )
 
-        content = generate_llm_draft(lead_summary=lead.summary, context_docs=None)
+        history = conversation_context(db, lead.tenant_id, convo.session_id) if convo else []
+        content = generate_llm_draft(
+            lead_summary=lead.summary,
+            context_docs=[format_transcript(history)] if history else None,
+            tenant_id=lead.tenant_id,
+            # written for this lead from its own transcript: nothing to share, and a
+            # new draft for the same lead should not replay an earlier one
+            use_cache=False,
+        )
 
         draft = AutomationDraft(
             kind="lead_followup",
@@ -53,16 +117,18 @@ def create_lead_followup_draft(lead_id: int):
         db.flush()  # ensures draft.id exists now
 
         if convo:
-            db.add(
-                Message(
-                    conversation_id=convo.id,
-                    tenant_id=lead.tenant_id,
-                    role="system",
-                    content=f"Draft created (pending):\n\n{content}",
-                )
+            note = Message(
+                conversation_id=convo.id,
+                tenant_id=lead.tenant_id,
+                role="system",
+                content=f"Draft created (pending):\n\n{content}",
+                created_at=datetime.utcnow(),
             )
+            db.add(note)
+            convo.record_message(note.role, note.created_at)
 
         db.commit()
+        bump_versions(lead.tenant_id, "drafts", "conversations")
         return {"ok": True, "draft_id": draft.id}
 
 
@@ -103,14 +169,76 @@ def create_ticket_reply_draft(ticket_id: int):
         db.flush()
 
         if convo:
-            db.add(
-                Message(
-                    conversation_id=convo.id,
-                    tenant_id=ticket.tenant_id,
-                    role="system",
-                    content=f"Draft created (pending):\n\n{content}",
-                )
+            note = Message(
+                conversation_id=convo.id,
+                tenant_id=ticket.tenant_id,
+                role="system",
+                content=f"Draft created (pending):\n\n{content}",
+                created_at=datetime.utcnow(),
             )
+            db.add(note)
+            convo.record_message(note.role, note.created_at)
 
         db.commit()
+        bump_versions(ticket.tenant_id, "drafts", "conversations")
         return {"ok": True, "draft_id": draft.id}
+
+
+def _schedule_next_rollup() -> None:
+    # Runs are aligned to ROLLUP_INTERVAL_SEC boundaries and the job id names the
+    # slot, so chains started by several workers at once collapse into one.
+    slot = int(time.time() // ROLLUP_INTERVAL_SEC) + 1
+    get_queue().enqueue_at(
+        datetime.fromtimestamp(slot * ROLLUP_INTERVAL_SEC, tz=timezone.utc),
+        "apps.worker.jobs.rollup_metrics_hourly",
+        job_id=f"rollup_metrics_hourly:{slot}",
+    )
+
+
+def rollup_metrics_hourly(reschedule: bool = True):
+    try:
+        with SessionLocal() as db:
+            watermarks = rollup_metrics(db)
+    finally:
+        # periodic: each run schedules the next one (needs the worker scheduler, see apps.worker.main)
+        if reschedule:
+            _schedule_next_rollup()
+    return {"ok": True, "watermarks": watermarks}
+
+
+def recompute_lead_scores(tenant_id: int):
+    job = get_current_job()
+
+    def _report(done: int, total: int, updated: int) -> None:
+        if job is not None:
+            job.meta["progress"] = {"done": done, "total": total, "updated": updated}
+            job.save_meta()
+
+    with SessionLocal() as db:
+        result = recompute_tenant_scores(db, tenant_id, on_progress=_report)
+    bump_versions(tenant_id, "leads")
+    return result
+
+
+def reclassify_tickets(tenant_id: int, only_unclassified: bool = True):
+    job = get_current_job()
+
+    def _report(done: int, total: int, updated: int) -> None:
+        if job is not None:
+            job.meta["progress"] = {"done": done, "total": total, "updated": updated}
+            job.save_meta()
+
+    with SessionLocal() as db:
+        result = reclassify_tenant_tickets(db, tenant_id, only_unclassified=only_unclassified, on_progress=_report)
+    if result["updated"]:
+        bump_versions(tenant_id, "tickets")
+    return result
+
+
+def rescore_leads_matching(tenant_id: int, predicates: list[dict]):
+    """Incremental rescore after a rule change: only leads the rule did or now does match."""
+    with SessionLocal() as db:
+        result = recompute_tenant_scores(db, tenant_id, predicates=predicates)
+    if result["updated"]:
+        bump_versions(tenant_id, "leads")
+    return result
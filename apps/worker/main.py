@@ -0,0 +1,19 @@
+"""Worker entrypoint: python -m apps.worker.main
+
+Runs an RQ worker (with the scheduler, for the periodic jobs) on the same pooled
+Redis client as the API and job code, instead of the connection `rq worker`
+builds from its own settings.
+"""
+
+from rq import Worker
+
+from core.queue import get_queue
+
+
+def main() -> None:
+    queue = get_queue()
+    Worker([queue], connection=queue.connection).work(with_scheduler=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +0,0 @@
-import os
-from redis import Redis
-
-REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
-conn = Redis.from_url(REDIS_URL)
@@ -0,0 +1,26 @@
+"""Seed the periodic jobs once before the worker starts: python -m apps.worker.schedule"""
+
+from rq.job import Job
+from rq.registry import ScheduledJobRegistry
+
+from core.queue import enqueue_unique, get_queue
+
+PERIODIC_JOBS = ["apps.worker.jobs.rollup_metrics_hourly"]
+
+
+def ensure_periodic_jobs() -> list[str]:
+    q = get_queue()
+    job_ids = ScheduledJobRegistry(queue=q).get_job_ids() + q.job_ids
+    pending = {j.func_name for j in Job.fetch_many(job_ids, connection=q.connection) if j is not None}
+
+    enqueued = []
+    for func_name in PERIODIC_JOBS:
+        if func_name not in pending:
+            # fixed id: workers booting together seed one chain, not one each
+            enqueue_unique(func_name, job_id=f"{func_name.rsplit('.', 1)[-1]}:seed")
+            enqueued.append(func_name)
+    return enqueued
+
+
+if __name__ == "__main__":
+    print({"enqueued": ensure_periodic_jobs()})
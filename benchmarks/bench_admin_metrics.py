@@ -0,0 +1,198 @@
+"""Benchmark /admin/metrics: legacy per-conversation loop vs set-based aggregation.
+
+Seeds a throwaway tenant into the database pointed at by DATABASE_URL, runs both
+implementations against it, and prints query count + latency for each.
+
+    python -m benchmarks.bench_admin_metrics --conversations 20000
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import delete, event, insert
+
+from core.db import SessionLocal, engine
+from core.models.crm import (
+    AutomationDraft,
+    Contact,
+    Conversation,
+    Lead,
+    Message,
+    Tenant,
+    Ticket,
+)
+from apps.api.routers.admin import _compute_metrics
+
+
+def legacy_get_metrics(db, tenant_id: int) -> dict:
+    """The pre-aggregation implementation, kept here as the baseline."""
+    contacts = db.query(Contact).filter(Contact.tenant_id == tenant_id).count()
+    leads = db.query(Lead).filter(Lead.tenant_id == tenant_id).count()
+    tickets = db.query(Ticket).filter(Ticket.tenant_id == tenant_id).count()
+    conversations = db.query(Conversation).filter(Conversation.tenant_id == tenant_id).count()
+    messages = db.query(Message).filter(Message.tenant_id == tenant_id).count()
+    drafts_total = db.query(AutomationDraft).filter(AutomationDraft.tenant_id == tenant_id).count()
+    drafts_pending = (
+        db.query(AutomationDraft)
+        .filter(AutomationDraft.tenant_id == tenant_id, AutomationDraft.status == "pending")
+        .count()
+    )
+    drafts_approved = (
+        db.query(AutomationDraft)
+        .filter(AutomationDraft.tenant_id == tenant_id, AutomationDraft.status == "approved")
+        .count()
+    )
+
+    deltas = []
+    convo_ids = [c.id for c in db.query(Conversation.id).filter(Conversation.tenant_id == tenant_id).all()]
+    for cid in convo_ids:
+        msgs = db.query(Message).filter(Message.conversation_id == cid).order_by(Message.id.asc()).all()
+        first_user = next((m for m in msgs if m.role == "user"), None)
+        if not first_user:
+            continue
+        first_assistant = next((m for m in msgs if m.role == "assistant" and m.id > first_user.id), None)
+        if not first_assistant:
+            continue
+        deltas.append((first_assistant.created_at - first_user.created_at).total_seconds())
+
+    return {
+        "contacts": contacts,
+        "leads": leads,
+        "tickets": tickets,
+        "conversations": conversations,
+        "messages": messages,
+        "drafts_total": drafts_total,
+        "drafts_pending": drafts_pending,
+        "drafts_approved": drafts_approved,
+        "avg_response_sec": sum(deltas) / len(deltas) if deltas else None,
+    }
+
+
+@contextmanager
+def count_queries():
+    counter = SimpleNamespace(n=0)
+
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        counter.n += 1
+
+    event.listen(engine, "before_cursor_execute", _before)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", _before)
+
+
+def seed(db, conversations: int, messages_per_convo: int) -> int:
+    tenant = Tenant(name="bench-admin-metrics")
+    db.add(tenant)
+    db.flush()
+    tenant_id = tenant.id
+
+    contact_rows = [
+        {"tenant_id": tenant_id, "email": f"bench-{tenant_id}-{i}@example.com", "created_at": datetime.utcnow()}
+        for i in range(conversations)
+    ]
+    contact_ids = db.execute(insert(Contact).returning(Contact.id), contact_rows).scalars().all()
+
+    base = datetime.utcnow() - timedelta(days=30)
+
+    def _message_at(i: int, j: int) -> datetime:
+        return base + timedelta(seconds=i + 5 * j + (i % 17))
+
+    convo_rows = [
+        {
+            "tenant_id": tenant_id,
+            "session_id": f"bench-{tenant_id}-{i}",
+            "contact_id": cid,
+            "channel": "web",
+            "created_at": datetime.utcnow(),
+            "first_user_at": _message_at(i, 0),
+            "first_assistant_at": _message_at(i, 1) if messages_per_convo > 1 else None,
+            "last_message_at": _message_at(i, messages_per_convo - 1),
+        }
+        for i, cid in enumerate(contact_ids)
+    ]
+    convo_ids = db.execute(insert(Conversation).returning(Conversation.id), convo_rows).scalars().all()
+
+    msg_rows = []
+    for i, cid in enumerate(convo_ids):
+        for j in range(messages_per_convo):
+            msg_rows.append(
+                {
+                    "tenant_id": tenant_id,
+                    "conversation_id": cid,
+                    "role": "user" if j % 2 == 0 else "assistant",
+                    "content": f"bench message {j}",
+                    "created_at": _message_at(i, j),
+                }
+            )
+        if len(msg_rows) >= 10_000:
+            db.execute(insert(Message), msg_rows)
+            msg_rows = []
+    if msg_rows:
+        db.execute(insert(Message), msg_rows)
+
+    lead_rows = [
+        {"tenant_id": tenant_id, "contact_id": cid, "status": "new", "score": 50, "created_at": datetime.utcnow()}
+        for cid in contact_ids[: conversations // 2]
+    ]
+    db.execute(insert(Lead), lead_rows)
+    db.commit()
+    return tenant_id
+
+
+def cleanup(db, tenant_id: int) -> None:
+    db.execute(delete(Message).where(Message.tenant_id == tenant_id))
+    db.execute(delete(Lead).where(Lead.tenant_id == tenant_id))
+    db.execute(delete(Conversation).where(Conversation.tenant_id == tenant_id))
+    db.execute(delete(Contact).where(Contact.tenant_id == tenant_id))
+    db.execute(delete(Tenant).where(Tenant.id == tenant_id))
+    db.commit()
+
+
+def _run(label: str, fn, repeat: int) -> dict:
+    timings = []
+    result = None
+    for _ in range(repeat):
+        with count_queries() as counter:
+            started = time.perf_counter()
+            result = fn()
+            timings.append(time.perf_counter() - started)
+    print(
+        f"{label:<12} queries={counter.n:<8} best={min(timings) * 1000:9.1f} ms  "
+        f"avg_response_sec={result['avg_response_sec']}"
+    )
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--conversations", type=int, default=5000)
+    parser.add_argument("--messages-per-convo", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--keep", action="store_true", help="keep the seeded tenant afterwards")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        tenant_id = seed(db, args.conversations, args.messages_per_convo)
+        print(f"seeded tenant {tenant_id}: {args.conversations} conversations, "
+              f"{args.conversations * args.messages_per_convo} messages")
+        try:
+            legacy = _run("legacy", lambda: legacy_get_metrics(db, tenant_id), args.repeat)
+            current = _run("set-based", lambda: _compute_metrics(db, tenant_id), args.repeat)
+            mismatched = [k for k in legacy if k != "avg_response_sec" and legacy[k] != current[k]]
+            if mismatched:
+                print(f"MISMATCH on {mismatched}")
+        finally:
+            if not args.keep:
+                db.rollback()
+                cleanup(db, tenant_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Microbenchmark: chained keyword scans vs the single-pass KeywordClassifier.
+
+The legacy scanners (intent, ticket tag/sentiment/urgency, topic, reply routing,
+greeting) are reproduced here as independent first-match scans, run on
+synthetic messages of increasing length, and checked for agreement.
+
+    python -m benchmarks.bench_classifier --messages 2000 --sizes 200,1000,5000
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+
+from apps.api.utils.classifier import DEFAULTS, TAXONOMY, classify
+from core import automaton
+
+FILLER = (
+    "we use hubspot and need the webhook sync fixed our invoice shows a charge twice the login page "
+    "is slow today please help asap thanks for the quick reply can you quote a demo for whatsapp "
+    "automation our dashboard reporting is broken since the migration and the team is frustrated"
+).split()
+
+
+def legacy_classify(text: str) -> dict:
+    # one `any(k in t ...)` scan per label, first hit wins, as the if/elif chains did
+    t = (text or "").lower()
+    return {
+        dim: next((label for label, keywords in entries if any(k in t for k in keywords)), DEFAULTS[dim])
+        for dim, entries in TAXONOMY.items()
+    }
+
+
+def make_messages(n: int, size: int, rng: random.Random) -> list[str]:
+    messages = []
+    for _ in range(n):
+        words = []
+        while sum(len(w) + 1 for w in words) < size:
+            words.append(rng.choice(FILLER) if rng.random() < 0.05 else f"w{rng.randint(0, 99999)}")
+        messages.append(" ".join(words))
+    return messages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--sizes", default="200,1000,5000", help="message lengths in characters")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    impl = "pyahocorasick" if automaton.ahocorasick is not None else "pure-python"
+    print(f"{args.messages} messages per size (automaton: {impl})")
+
+    for size in [int(s) for s in args.sizes.split(",")]:
+        messages = make_messages(args.messages, size, rng)
+
+        started = time.perf_counter()
+        legacy = [legacy_classify(m) for m in messages]
+        legacy_sec = time.perf_counter() - started
+
+        started = time.perf_counter()
+        single = [classify(m) for m in messages]
+        single_sec = time.perf_counter() - started
+
+        print(
+            f"{size:6d} chars  chained scans {legacy_sec / len(messages) * 1e6:8.1f} us/msg  "
+            f"single pass {single_sec / len(messages) * 1e6:8.1f} us/msg  "
+            f"speedup {legacy_sec / single_sec:.1f}x"
+        )
+
+        mismatches = sum(1 for a, b in zip(legacy, single) if a != b)
+        if mismatches:
+            print(f"  MISMATCH on {mismatches} messages")
+
+
+if __name__ == "__main__":
+    main()
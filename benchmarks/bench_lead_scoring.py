@@ -0,0 +1,87 @@
+"""Microbenchmark: per-rule substring scan vs the compiled RuleEngine.
+
+Runs fully in memory (no database): synthetic rules and leads, both scorers,
+and a check that they agree on every lead.
+
+    python -m benchmarks.bench_lead_scoring --rules 500 --leads 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from types import SimpleNamespace
+
+from core import automaton
+from core.scoring import RuleEngine, apply_rule
+
+WORDS = (
+    "hubspot salesforce pipedrive crm integration api webhook whatsapp zapier automation workflow "
+    "pricing quote demo budget migration urgent enterprise support onboarding dashboard sync data "
+    "billing invoice forms website timeline pipeline routing nurture sequence reporting analytics"
+).split()
+STATUSES = ["new", "contacted", "qualified", "won", "lost"]
+
+
+def make_rules(n: int, rng: random.Random) -> list:
+    rules = []
+    for i in range(n):
+        if rng.random() < 0.1:
+            rules.append(
+                SimpleNamespace(id=i, field="status", operator="equals", value=rng.choice(STATUSES), points=5)
+            )
+        else:
+            value = " ".join(rng.sample(WORDS, rng.choice([1, 1, 2]))) + rng.choice(["", f" {i}"])
+            rules.append(
+                SimpleNamespace(id=i, field="summary", operator="contains", value=value, points=rng.randint(1, 20))
+            )
+    return rules
+
+
+def make_leads(n: int, rng: random.Random) -> list:
+    return [
+        SimpleNamespace(
+            summary=" ".join(rng.choices(WORDS, k=rng.randint(10, 40))).capitalize(),
+            status=rng.choice(STATUSES),
+        )
+        for _ in range(n)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rules", type=int, default=500)
+    parser.add_argument("--leads", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rules = make_rules(args.rules, rng)
+    leads = make_leads(args.leads, rng)
+    impl = "pyahocorasick" if automaton.ahocorasick is not None else "pure-python"
+    print(f"{args.rules} rules x {args.leads} leads (automaton: {impl})")
+
+    started = time.perf_counter()
+    naive = [sum(apply_rule(lead, r) for r in rules) for lead in leads]
+    naive_sec = time.perf_counter() - started
+    print(f"per-rule scan   {naive_sec:8.2f} s  {naive_sec / len(leads) * 1e6:8.1f} us/lead")
+
+    started = time.perf_counter()
+    engine = RuleEngine(rules)
+    compile_sec = time.perf_counter() - started
+    started = time.perf_counter()
+    compiled = [engine.score_lead(lead) for lead in leads]
+    compiled_sec = time.perf_counter() - started
+    print(
+        f"compiled engine {compiled_sec:8.2f} s  {compiled_sec / len(leads) * 1e6:8.1f} us/lead  "
+        f"(compile {compile_sec * 1000:.1f} ms, speedup {naive_sec / compiled_sec:.1f}x)"
+    )
+
+    mismatches = sum(1 for a, b in zip(naive, compiled) if a != b)
+    if mismatches:
+        print(f"MISMATCH on {mismatches} leads")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Microbenchmark: a new OpenAI client per call vs the process-wide pooled client.
+
+Serves a minimal OpenAI-compatible endpoint on localhost (with --tls, over HTTPS
+with a throwaway self-signed certificate; needs the openssl CLI), calls it
+sequentially through both, and prints per-call latency and how many connections
+the server accepted. The request is tiny, so the difference is client setup
+(mostly loading the CA bundle), TCP connect and TLS handshake. With --tls the
+trust store is just the test certificate, which makes a new client cheaper
+than in production.
+
+    python -m benchmarks.bench_llm_client --calls 300 --tls
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from openai import OpenAI
+
+from core.config import settings
+from core.llm import client as llm_client
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # headers and body are separate writes
+
+    def do_GET(self):
+        body = json.dumps(
+            {"id": self.path.rsplit("/", 1)[-1], "object": "model", "created": 0, "owned_by": "bench"}
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    ssl_context: ssl.SSLContext | None = None
+    connections = 0
+
+    def get_request(self):
+        sock, addr = super().get_request()
+        self.connections += 1
+        if self.ssl_context is not None:
+            sock = self.ssl_context.wrap_socket(sock, server_side=True)
+        return sock, addr
+
+
+def _self_signed(directory: str) -> tuple[str, str]:
+    cert, key = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+            "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1",
+            "-keyout", key, "-out", cert,
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return cert, key
+
+
+def run(server: _Server, calls: int, get_client) -> tuple[float, int]:
+    before = server.connections
+    started = time.perf_counter()
+    for _ in range(calls):
+        get_client().models.retrieve(settings.llm_model)
+    return (time.perf_counter() - started) / calls, server.connections - before
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--tls", action="store_true", help="serve HTTPS with a self-signed certificate")
+    args = parser.parse_args()
+
+    server = _Server(("127.0.0.1", 0), _Handler)
+    tmp = tempfile.TemporaryDirectory()
+    scheme = "http"
+    if args.tls:
+        cert, key = _self_signed(tmp.name)
+        server.ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        server.ssl_context.load_cert_chain(cert, key)
+        os.environ["SSL_CERT_FILE"] = cert  # trusted by both clients' httpx defaults
+        scheme = "https"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"{scheme}://localhost:{server.server_address[1]}/v1"
+
+    settings.openai_api_key = "bench"
+    settings.llm_base_url = base_url
+
+    def fresh_client():
+        # what _openai_client() used to do on every call
+        return OpenAI(api_key=settings.openai_api_key, base_url=base_url)
+
+    run(server, 5, llm_client._openai_client)  # warm up imports and the pool
+    print(f"{args.calls} sequential calls to {base_url}")
+    for name, get_client in [("new client per call", fresh_client), ("process-wide client", llm_client._openai_client)]:
+        per_call, connections = run(server, args.calls, get_client)
+        print(f"  {name:22s} {per_call * 1e3:7.2f} ms/call  {connections:5d} connections")
+
+    server.shutdown()
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
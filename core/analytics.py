@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import Select, and_, func, literal_column, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from core.models.analytics import IntentDailyCount, MetricsHourly, RollupWatermark
+from core.models.crm import AutomationDraft, Conversation, Lead, Message, Ticket
+
+# Rows newer than this are left for the next run so in-flight transactions with
+# lower ids can commit before the watermark moves past them.
+ROLLUP_LAG = timedelta(seconds=30)
+ROLLUP_BATCH = 50_000
+
+
+def increment_intent_count(db: Session, tenant_id: int, day: date, intent: str, n: int = 1) -> None:
+    """Bump the (tenant, day, intent) rollup row; joins the caller's transaction."""
+    stmt = insert(IntentDailyCount).values(tenant_id=tenant_id, day=day, intent=intent, count=n)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[IntentDailyCount.tenant_id, IntentDailyCount.day, IntentDailyCount.intent],
+            set_={"count": IntentDailyCount.count + stmt.excluded.count},
+        )
+    )
+
+
+def _is_tz_aware(col) -> bool:
+    return bool(getattr(col.type, "timezone", False))
+
+
+def _hour(col):
+    # literals so the SELECT and GROUP BY expressions render identically
+    if _is_tz_aware(col):
+        col = func.timezone(literal_column("'UTC'"), col)  # timestamptz -> naive UTC, as elsewhere
+    return func.date_trunc(literal_column("'hour'"), col)
+
+
+def _as_column_time(col, value: datetime) -> datetime:
+    # our naive datetimes are UTC; timestamptz columns (automation_drafts) get an aware
+    # value so the comparison doesn't depend on the session time zone
+    return value.replace(tzinfo=timezone.utc) if _is_tz_aware(col) else value
+
+
+def _add_to_buckets(db: Session, source: Select, columns: list[str]) -> None:
+    """INSERT ... SELECT (tenant_id, hour, *columns) and add onto any existing bucket."""
+    stmt = insert(MetricsHourly).from_select(["tenant_id", "hour", *columns], source)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[MetricsHourly.tenant_id, MetricsHourly.hour],
+            set_={c: getattr(MetricsHourly, c) + getattr(stmt.excluded, c) for c in columns},
+        )
+    )
+
+
+def _lock_watermark(db: Session, name: str) -> RollupWatermark:
+    db.execute(insert(RollupWatermark).values(name=name, last_id=0).on_conflict_do_nothing())
+    return db.get(RollupWatermark, name, with_for_update=True, populate_existing=True)
+
+
+def _next_id(db: Session, model, last_id: int, cutoff: datetime) -> int | None:
+    """Upper bound of the next batch past last_id, skipping over id gaps."""
+    settled = model.created_at <= _as_column_time(model.created_at, cutoff)
+    first = db.execute(select(func.min(model.id)).where(model.id > last_id, settled)).scalar()
+    if first is None:
+        return None
+    return db.execute(
+        select(func.max(model.id)).where(model.id >= first, model.id < first + ROLLUP_BATCH, settled)
+    ).scalar()
+
+
+def _rollup_messages(db: Session, lo: int, hi: int) -> None:
+    window = and_(Message.id > lo, Message.id <= hi, Message.tenant_id.is_not(None))
+    _add_to_buckets(
+        db,
+        select(Message.tenant_id, _hour(Message.created_at), func.count())
+        .where(window)
+        .group_by(Message.tenant_id, _hour(Message.created_at)),
+        ["messages"],
+    )
+    # the assistant message that set first_assistant_at closes the conversation's first response
+    response_sec = func.extract("epoch", Conversation.first_assistant_at - Conversation.first_user_at)
+    _add_to_buckets(
+        db,
+        select(
+            Conversation.tenant_id,
+            _hour(Conversation.first_assistant_at),
+            func.sum(response_sec),
+            func.count(),
+        )
+        .join(Message, Message.conversation_id == Conversation.id)
+        .where(
+            window,
+            Message.role == "assistant",
+            Message.created_at == Conversation.first_assistant_at,
+        )
+        .group_by(Conversation.tenant_id, _hour(Conversation.first_assistant_at)),
+        ["first_response_sum_sec", "first_response_count"],
+    )
+
+
+def _rollup_created(column: str, model):
+    def _rollup(db: Session, lo: int, hi: int) -> None:
+        _add_to_buckets(
+            db,
+            select(model.tenant_id, _hour(model.created_at), func.count())
+            .where(model.id > lo, model.id <= hi, model.tenant_id.is_not(None))
+            .group_by(model.tenant_id, _hour(model.created_at)),
+            [column],
+        )
+
+    return _rollup
+
+
+ID_STREAMS = {
+    "messages": (Message, _rollup_messages),
+    "leads": (Lead, _rollup_created("leads_created", Lead)),
+    "tickets": (Ticket, _rollup_created("tickets_created", Ticket)),
+    "automation_drafts": (AutomationDraft, _rollup_created("drafts_created", AutomationDraft)),
+}
+
+
+def _rollup_draft_decisions(db: Session, since: datetime | None, until: datetime) -> None:
+    for column, decided_at in [
+        ("drafts_approved", AutomationDraft.approved_at),
+        ("drafts_rejected", AutomationDraft.rejected_at),
+    ]:
+        q = (
+            select(AutomationDraft.tenant_id, _hour(decided_at), func.count())
+            .where(decided_at <= _as_column_time(decided_at, until), AutomationDraft.tenant_id.is_not(None))
+            .group_by(AutomationDraft.tenant_id, _hour(decided_at))
+        )
+        if since is not None:
+            q = q.where(decided_at > _as_column_time(decided_at, since))
+        _add_to_buckets(db, q, [column])
+
+
+def rollup_metrics(db: Session) -> dict:
+    """Fold new rows into metrics_hourly, one committed batch at a time.
+
+    Each source stream keeps its own high-watermark row, locked FOR UPDATE for the
+    duration of a batch, so overlapping runs serialize instead of double counting.
+    """
+    cutoff = datetime.utcnow() - ROLLUP_LAG
+    watermarks = {}
+
+    for name, (model, rollup) in ID_STREAMS.items():
+        while True:
+            wm = _lock_watermark(db, name)
+            watermarks[name] = wm.last_id
+            hi = _next_id(db, model, wm.last_id, cutoff)
+            if hi is None:
+                db.rollback()
+                break
+            rollup(db, wm.last_id, hi)
+            wm.last_id = hi
+            db.commit()
+            watermarks[name] = hi
+
+    # approvals / rejections update existing drafts, so they are tracked by decision time
+    wm = _lock_watermark(db, "draft_decisions")
+    if wm.last_at is None or wm.last_at < cutoff:
+        _rollup_draft_decisions(db, wm.last_at, cutoff)
+        wm.last_at = cutoff
+    watermarks["draft_decisions"] = wm.last_at.isoformat()
+    db.commit()
+
+    return watermarks
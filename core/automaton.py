@@ -0,0 +1,73 @@
+"""Multi-pattern substring matching (Aho-Corasick) shared by scoring and classification."""
+
+from __future__ import annotations
+
+from collections import deque
+from typing import Iterable
+
+try:
+    import ahocorasick  # pyahocorasick, C implementation
+except Exception:
+    ahocorasick = None
+
+
+class _PyAutomaton:
+    """Pure-Python Aho-Corasick used when pyahocorasick is not installed."""
+
+    def __init__(self, patterns: Iterable[str]):
+        self._goto: list[dict[str, int]] = [{}]
+        self._out: list[tuple[str, ...]] = [()]
+        own: list[list[str]] = [[]]
+        for word in patterns:
+            state = 0
+            for ch in word:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    own.append([])
+                state = nxt
+            own[state].append(word)
+
+        self._fail = [0] * len(self._goto)
+        self._out = [tuple(o) for o in own]
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def matches(self, text: str) -> set[str]:
+        goto, fail, out = self._goto, self._fail, self._out
+        found: set[str] = set()
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
+class _CAutomaton:
+    def __init__(self, patterns: Iterable[str]):
+        self._a = ahocorasick.Automaton()
+        for word in patterns:
+            self._a.add_word(word, word)
+        self._a.make_automaton()
+
+    def matches(self, text: str) -> set[str]:
+        return {word for _, word in self._a.iter(text)}
+
+
+def build_automaton(patterns: Iterable[str]):
+    """Compile non-empty patterns; .matches(text) returns the set of patterns found in text."""
+    impl = _CAutomaton if ahocorasick is not None else _PyAutomaton
+    return impl(patterns)
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Iterable
+
+from redis.exceptions import RedisError
+
+from core.config import settings
+from core.redis_pool import get_async_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+MISS = object()  # returned by LRUCache.get() for absent or expired keys
+
+
+class LRUCache:
+    """Small thread-safe LRU with per-entry expiry, used as the in-process tier."""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return MISS
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return MISS
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+_local = LRUCache(settings.admin_cache_local_size)
+
+
+# (tenant_id, entity) -> monotonic time until which reads bypass the cache because
+# a version bump for it failed; by then every entry cached before the write has expired
+_dirty: dict[tuple[int, str], float] = {}
+_dirty_lock = threading.Lock()
+
+
+def _version_key(tenant_id: int, entity: str) -> str:
+    return f"cache:v:{tenant_id}:{entity}"
+
+
+def _bump_failed(tenant_id: int, entities: tuple[str, ...], exc: RedisError) -> None:
+    logger.warning("cache version bump failed for tenant %s %s: %s", tenant_id, list(entities), exc)
+    until = time.monotonic() + settings.admin_cache_ttl_sec
+    with _dirty_lock:
+        for entity in entities:
+            _dirty[(tenant_id, entity)] = until
+
+
+def _is_dirty(tenant_id: int, entities: Iterable[str]) -> bool:
+    if not _dirty:
+        return False
+    now = time.monotonic()
+    with _dirty_lock:
+        for entity in entities:
+            until = _dirty.get((tenant_id, entity))
+            if until is None:
+                continue
+            if until > now:
+                return True
+            del _dirty[(tenant_id, entity)]
+    return False
+
+
+def bump_versions(tenant_id: int | None, *entities: str) -> None:
+    """Invalidate every cached read that depends on these entities. Call after commit.
+
+    If Redis can't be reached, this process stops using cached reads of the
+    entities for one cache TTL instead of serving what the write just changed.
+    """
+    if tenant_id is None or not entities:
+        return
+    try:
+        pipe = get_redis("cache").pipeline(transaction=False)
+        for entity in entities:
+            pipe.incr(_version_key(tenant_id, entity))
+        pipe.execute()
+    except RedisError as exc:
+        _bump_failed(tenant_id, entities, exc)
+
+
+async def abump_versions(tenant_id: int | None, *entities: str) -> None:
+    """bump_versions() for async endpoints."""
+    if tenant_id is None or not entities:
+        return
+    try:
+        pipe = get_async_redis("cache").pipeline(transaction=False)
+        for entity in entities:
+            pipe.incr(_version_key(tenant_id, entity))
+        await pipe.execute()
+    except RedisError as exc:
+        _bump_failed(tenant_id, entities, exc)
+
+
+def cached(
+    tenant_id: int,
+    name: str,
+    entities: Iterable[str],
+    compute: Callable[[], Any],
+    params: dict | None = None,
+    ttl: int | None = None,
+) -> Any:
+    """Return compute() through the local LRU + Redis tiers.
+
+    The key embeds the tenant's current version of each entity the result depends on,
+    so a bump_versions() from any process makes old entries unreachable. If Redis is
+    unavailable the versions are unknown and we compute directly rather than risk
+    serving stale data; the same goes for entities whose last bump here failed.
+    """
+    if not settings.admin_cache_enabled:
+        return compute()
+    ttl = ttl or settings.admin_cache_ttl_sec
+    entities = list(entities)
+    if _is_dirty(tenant_id, entities):
+        return compute()
+
+    try:
+        r = get_redis("cache")
+        versions = r.mget([_version_key(tenant_id, e) for e in entities])
+    except RedisError:
+        return compute()
+
+    stamp = ".".join((v or b"0").decode() for v in versions)
+    param_part = json.dumps(params or {}, sort_keys=True, default=str)
+    key = f"cache:{tenant_id}:{name}:{param_part}:{stamp}"
+
+    value = _local.get(key)
+    if value is not MISS:
+        return value
+
+    try:
+        raw = r.get(key)
+    except RedisError:
+        raw = None
+    if raw is not None:
+        value = json.loads(raw)
+        _local.set(key, value, ttl)
+        return value
+
+    value = compute()
+    try:
+        r.set(key, json.dumps(value, default=str), ex=ttl)
+    except RedisError:
+        pass
+    _local.set(key, value, ttl)
+    return value
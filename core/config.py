@@ -12,9 +12,55 @@ class Settings(BaseSettings):
     llm_provider: str = "openai"
     openai_api_key: str | None = None
     llm_model: str = "gpt-4o-mini"
+    llm_base_url: str | None = None  # OpenAI-compatible endpoint; None = api.openai.com
+    llm_connect_timeout_sec: float = 5.0
+    llm_read_timeout_sec: float = 30.0
+    llm_max_connections: int = 20
+    llm_max_keepalive: int = 10
+    llm_keepalive_expiry_sec: float = 30.0
+    llm_deadline_sec: float = 12.0  # whole call, retries included
+    llm_max_retries: int = 2
+    llm_retry_base_sec: float = 0.25
+    llm_retry_max_sec: float = 2.0
+    llm_breaker_failures: int = 5  # consecutive provider errors before the breaker opens
+    llm_breaker_cooldown_sec: float = 30.0
+
+    llm_cache_backend: str = "memory"  # off | memory | sqlite | redis
+    llm_cache_ttl_sec: int = 86400
+    llm_cache_max_entries: int = 5000
+    llm_cache_sqlite_path: str = ".cache/llm_responses.sqlite3"
 
     jwt_secret: str = "change-me"
     jwt_algorithm: str = "HS256"
     jwt_exp_minutes: int = 60
 
+    admin_cache_enabled: bool = True
+    admin_cache_ttl_sec: int = 300
+    admin_cache_local_size: int = 1024
+
+    taxonomy_poll_sec: float = 5.0
+
+    reply_cache_enabled: bool = True
+    reply_cache_ttl_sec: int = 3600
+    reply_cache_local_size: int = 2048
+    reply_cache_local_ttl_sec: int = 60  # bounds how long a cleared entry survives in other processes
+    reply_cache_tenant_max: int = 5000  # shared-tier entries per tenant, oldest evicted first
+    reply_cache_max_chars: int = 200  # longer messages are too specific to repeat
+
+    # token buckets: sustained rate per second and burst size
+    ratelimit_enabled: bool = True
+    chat_tenant_rate: float = 5.0
+    chat_tenant_burst: float = 30.0
+    chat_global_rate: float = 100.0
+    chat_global_burst: float = 300.0
+    llm_tenant_rate: float = 1.0
+    llm_tenant_burst: float = 10.0
+    llm_global_rate: float = 20.0
+    llm_global_burst: float = 60.0
+
+    # conversation history sent with LLM prompts
+    llm_context_messages: int = 12  # tail query limit
+    llm_context_token_budget: int = 1200
+    llm_context_cache_ttl_sec: int = 900
+
 settings = Settings()
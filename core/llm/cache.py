@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from redis.exceptions import RedisError
+
+from core.cache import MISS, LRUCache
+from core.config import settings
+from core.redis_pool import get_async_redis, get_redis
+
+
+def llm_cache_key(request: dict) -> str:
+    """Hash of the full provider request: model, prompts, history and max output tokens."""
+    return hashlib.sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()
+
+
+class MemoryBackend:
+    """Per-process LRU; lost on restart and not shared between workers."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int):
+        self._lru = LRUCache(max_entries)
+
+    def get(self, key: str) -> str | None:
+        value = self._lru.get(key)
+        return None if value is MISS else value
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        self._lru.set(key, value, ttl)
+
+    def size(self) -> int:
+        return len(self._lru)
+
+    async def aget(self, key: str) -> str | None:
+        return self.get(key)
+
+    async def aset(self, key: str, value: str, ttl: int) -> None:
+        self.set(key, value, ttl)
+
+
+class SQLiteBackend:
+    """Local file shared by the processes of one host, kept across restarts.
+
+    Least recently used rows beyond max_entries are deleted every EVICT_EVERY writes.
+    """
+
+    name = "sqlite"
+    EVICT_EVERY = 100
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._pid: int | None = None
+        self._writes = 0
+
+    def _db(self) -> sqlite3.Connection:
+        # one connection per process: sqlite handles must not be used across a fork
+        if self._conn is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, used_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_used_at ON llm_cache (used_at)")
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            try:
+                db = self._db()
+                row = db.execute(
+                    "SELECT value FROM llm_cache WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+                if row is not None:
+                    db.execute("UPDATE llm_cache SET used_at = ? WHERE key = ?", (now, key))
+            except sqlite3.Error:
+                return None
+        return row[0] if row is not None else None
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        now = time.time()
+        with self._lock:
+            try:
+                db = self._db()
+                db.execute("INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?)", (key, value, now + ttl, now))
+                self._writes += 1
+                if self._writes % self.EVICT_EVERY == 0:
+                    db.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+                    db.execute(
+                        "DELETE FROM llm_cache WHERE key IN "
+                        "(SELECT key FROM llm_cache ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                        (self.max_entries,),
+                    )
+            except sqlite3.Error:
+                pass
+
+    def size(self) -> int:
+        with self._lock:
+            try:
+                return self._db().execute("SELECT count(*) FROM llm_cache").fetchone()[0]
+            except sqlite3.Error:
+                return 0
+
+    # file I/O (and waits on the lock or on other processes' writes) stays off the event loop
+    async def aget(self, key: str) -> str | None:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: str, ttl: int) -> None:
+        await asyncio.to_thread(self.set, key, value, ttl)
+
+
+class RedisBackend:
+    """Shared by every API and worker process; the oldest entries beyond max_entries are evicted.
+
+    The index scores each entry by its expiry time, so expired members are pruned
+    from it before counting.
+    """
+
+    name = "redis"
+    INDEX = "llm:idx"
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+
+    @staticmethod
+    def _key(key: str) -> str:
+        return f"llm:{key}"
+
+    def _queue_store(self, pipe, key: str, value: str, ttl: int) -> None:
+        now = time.time()
+        pipe.set(self._key(key), value, ex=ttl)
+        pipe.zadd(self.INDEX, {self._key(key): now + ttl})
+        pipe.zremrangebyscore(self.INDEX, "-inf", now)
+        pipe.zcard(self.INDEX)
+
+    def get(self, key: str) -> str | None:
+        try:
+            raw = get_redis("cache").get(self._key(key))
+        except RedisError:
+            return None
+        return raw.decode() if raw is not None else None
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        try:
+            r = get_redis("cache")
+            pipe = r.pipeline(transaction=False)
+            self._queue_store(pipe, key, value, ttl)
+            size = pipe.execute()[-1]
+            if size > self.max_entries:
+                evicted = [member for member, _ in r.zpopmin(self.INDEX, size - self.max_entries)]
+                if evicted:
+                    r.delete(*evicted)
+        except RedisError:
+            pass
+
+    def size(self) -> int:
+        try:
+            pipe = get_redis("cache").pipeline(transaction=False)
+            pipe.zremrangebyscore(self.INDEX, "-inf", time.time())
+            pipe.zcard(self.INDEX)
+            return pipe.execute()[-1]
+        except RedisError:
+            return 0
+
+    async def aget(self, key: str) -> str | None:
+        try:
+            raw = await get_async_redis("cache").get(self._key(key))
+        except RedisError:
+            return None
+        return raw.decode() if raw is not None else None
+
+    async def aset(self, key: str, value: str, ttl: int) -> None:
+        try:
+            r = get_async_redis("cache")
+            pipe = r.pipeline(transaction=False)
+            self._queue_store(pipe, key, value, ttl)
+            size = (await pipe.execute())[-1]
+            if size > self.max_entries:
+                evicted = [member for member, _ in await r.zpopmin(self.INDEX, size - self.max_entries)]
+                if evicted:
+                    await r.delete(*evicted)
+        except RedisError:
+            pass
+
+
+_backend = None
+_backend_lock = threading.Lock()
+_stats: Counter = Counter()  # hits, misses, stores, bypassed in this process
+
+
+def get_backend():
+    """Backend named by settings.llm_cache_backend, or None when the cache is off."""
+    global _backend
+    if _backend is None and settings.llm_cache_backend != "off":
+        with _backend_lock:
+            if _backend is None:
+                name = settings.llm_cache_backend
+                if name == "sqlite":
+                    _backend = SQLiteBackend(settings.llm_cache_sqlite_path, settings.llm_cache_max_entries)
+                elif name == "redis":
+                    _backend = RedisBackend(settings.llm_cache_max_entries)
+                else:
+                    _backend = MemoryBackend(settings.llm_cache_max_entries)
+    return _backend
+
+
+def cache_key_for(request: dict, use_cache: bool) -> str | None:
+    """Key to look the request up under, or None if this call must reach the provider."""
+    if get_backend() is None:
+        return None
+    if not use_cache:
+        _stats["bypassed"] += 1
+        return None
+    return llm_cache_key(request)
+
+
+def lookup(key: str) -> str | None:
+    value = get_backend().get(key)
+    _stats["hits" if value is not None else "misses"] += 1
+    return value
+
+
+async def alookup(key: str) -> str | None:
+    value = await get_backend().aget(key)
+    _stats["hits" if value is not None else "misses"] += 1
+    return value
+
+
+def store(key: str, value: str) -> None:
+    get_backend().set(key, value, settings.llm_cache_ttl_sec)
+    _stats["stores"] += 1
+
+
+async def astore(key: str, value: str) -> None:
+    await get_backend().aset(key, value, settings.llm_cache_ttl_sec)
+    _stats["stores"] += 1
+
+
+def llm_cache_stats() -> dict:
+    backend = get_backend()
+    lookups = _stats["hits"] + _stats["misses"]
+    return {
+        "backend": backend.name if backend is not None else "off",
+        "entries": backend.size() if backend is not None else 0,
+        "hits": _stats["hits"],
+        "misses": _stats["misses"],
+        "stores": _stats["stores"],
+        "bypassed": _stats["bypassed"],
+        "hit_rate": round(_stats["hits"] / lookups, 3) if lookups else None,
+    }
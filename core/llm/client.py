@@ -1,45 +1,279 @@
 from __future__ import annotations
 
-from typing import Iterable
+import asyncio
+import os
+import threading
+import time
+from typing import AsyncIterator, Iterable
 
 from core.config import settings
+from core.llm import cache as llm_cache
+from core.llm import resilience
+from core.ratelimit import aadmit, admit
+
+CHAT_SYSTEM_PROMPT = (
+    "You are a ClientOps chat assistant. Respond in 3-6 short sentences. Be clear and helpful. "
+    "Ask exactly one clarifying question. If the user asks about services, list 3-5 service bullets "
+    "and end with the clarifying question."
+)
+
+
+class StreamInterrupted(Exception):
+    """The provider failed after part of a streamed reply had already been yielded."""
+
+
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+
+
+def _reset_clients_after_fork() -> None:
+    # A forked child (RQ work horse) must not reuse the parent's pooled sockets.
+    # Drop the references without closing: closing would shut the TLS sessions
+    # the parent is still using.
+    global _client, _async_client
+    _client = None
+    _async_client = None
+
+
+os.register_at_fork(after_in_child=_reset_clients_after_fork)
+
+
+def _http_options() -> dict:
+    import httpx
+
+    return {
+        "timeout": httpx.Timeout(settings.llm_read_timeout_sec, connect=settings.llm_connect_timeout_sec),
+        "limits": httpx.Limits(
+            max_connections=settings.llm_max_connections,
+            max_keepalive_connections=settings.llm_max_keepalive,
+            keepalive_expiry=settings.llm_keepalive_expiry_sec,
+        ),
+    }
 
 
 def _openai_client():
+    # one client per process: connections (and TLS sessions) are kept alive across calls
+    global _client
     if not settings.openai_api_key:
         return None
-    try:
-        from openai import OpenAI
-    except Exception:
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                try:
+                    from openai import DefaultHttpxClient, OpenAI
+                except Exception:
+                    return None
+                options = _http_options()
+                _client = OpenAI(
+                    api_key=settings.openai_api_key,
+                    base_url=settings.llm_base_url,
+                    timeout=options["timeout"],
+                    max_retries=0,  # retries, deadline and breaker are handled in this module
+                    http_client=DefaultHttpxClient(**options),
+                )
+    return _client
+
+
+def _async_openai_client():
+    # one client per process so its connection pool is shared by concurrent requests
+    global _async_client
+    if not settings.openai_api_key:
         return None
-    return OpenAI(api_key=settings.openai_api_key)
+    if _async_client is None:
+        try:
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+        except Exception:
+            return None
+        options = _http_options()
+        _async_client = AsyncOpenAI(
+            api_key=settings.openai_api_key,
+            base_url=settings.llm_base_url,
+            timeout=options["timeout"],
+            max_retries=0,
+            http_client=DefaultAsyncHttpxClient(**options),
+        )
+    return _async_client
 
 
-def _generate_with_openai(system_prompt: str, user_prompt: str) -> str | None:
+def _response_request(system_prompt: str, user_prompt: str, history: list[dict] | None = None) -> dict:
+    # history: earlier [{role, content}] turns, oldest first (see core.llm.context)
+    turns = [
+        {
+            "role": turn["role"],
+            "content": [
+                {"type": "output_text" if turn["role"] == "assistant" else "input_text", "text": turn["content"]}
+            ],
+        }
+        for turn in history or []
+    ]
+    return {
+        "model": settings.llm_model,
+        "input": [
+            {
+                "role": "system",
+                "content": [{"type": "input_text", "text": system_prompt}],
+            },
+            *turns,
+            {
+                "role": "user",
+                "content": [{"type": "input_text", "text": user_prompt}],
+            },
+        ],
+        "max_output_tokens": 300,
+    }
+
+
+# Identical requests are answered from core.llm.cache when enabled (use_cache=False
+# opts a call out). A call that does reach the model:
+#   - is refused at once while the circuit breaker is open (core.llm.resilience);
+#   - takes a token from the tenant's and the global "llm" bucket;
+#   - gets `deadline_sec` (default settings.llm_deadline_sec) for all of its attempts,
+#     with provider errors retried after a jittered backoff.
+# Refused, over budget or out of time, it behaves like "no LLM configured" and
+# callers use their fallbacks.
+
+
+def _generate_with_openai(
+    system_prompt: str,
+    user_prompt: str,
+    tenant_id: int | None = None,
+    history: list[dict] | None = None,
+    use_cache: bool = True,
+    deadline_sec: float | None = None,
+) -> str | None:
     client = _openai_client()
     if client is None:
         return None
-    try:
-        response = client.responses.create(
-            model=settings.llm_model,
-            input=[
-                {
-                    "role": "system",
-                    "content": [{"type": "input_text", "text": system_prompt}],
-                },
-                {
-                    "role": "user",
-                    "content": [{"type": "input_text", "text": user_prompt}],
-                },
-            ],
-            max_output_tokens=300,
-        )
-        return response.output_text
-    except Exception:
+    request = _response_request(system_prompt, user_prompt, history)
+    key = llm_cache.cache_key_for(request, use_cache)
+    if key is not None:
+        cached = llm_cache.lookup(key)
+        if cached is not None:
+            return cached
+    if not resilience.breaker.allow() or not admit("llm", tenant_id):
         return None
 
+    deadline = time.monotonic() + (deadline_sec or settings.llm_deadline_sec)
+    attempt = 0
+    while True:
+        try:
+            text = client.responses.create(**request, timeout=deadline - time.monotonic()).output_text
+            break
+        except Exception as exc:
+            delay = resilience.retry_delay(attempt, deadline) if resilience.record_failure(exc) else None
+            if delay is None:
+                return None
+            time.sleep(delay)
+            attempt += 1
+    resilience.record_success()
+    if key is not None and text:
+        llm_cache.store(key, text)
+    return text
+
+
+async def _agenerate_with_openai(
+    system_prompt: str,
+    user_prompt: str,
+    tenant_id: int | None = None,
+    history: list[dict] | None = None,
+    use_cache: bool = True,
+    deadline_sec: float | None = None,
+) -> str | None:
+    client = _async_openai_client()
+    if client is None:
+        return None
+    request = _response_request(system_prompt, user_prompt, history)
+    key = llm_cache.cache_key_for(request, use_cache)
+    if key is not None:
+        cached = await llm_cache.alookup(key)
+        if cached is not None:
+            return cached
+    if not await resilience.breaker.aallow() or not await aadmit("llm", tenant_id):
+        return None
+
+    deadline = time.monotonic() + (deadline_sec or settings.llm_deadline_sec)
+    attempt = 0
+    while True:
+        remaining = deadline - time.monotonic()
+        try:
+            response = await asyncio.wait_for(client.responses.create(**request, timeout=remaining), remaining)
+            text = response.output_text
+            break
+        except Exception as exc:
+            delay = resilience.retry_delay(attempt, deadline) if await resilience.arecord_failure(exc) else None
+            if delay is None:
+                return None
+            await asyncio.sleep(delay)
+            attempt += 1
+    await resilience.arecord_success()
+    if key is not None and text:
+        await llm_cache.astore(key, text)
+    return text
+
+
+async def _astream_with_openai(
+    system_prompt: str,
+    user_prompt: str,
+    tenant_id: int | None = None,
+    history: list[dict] | None = None,
+    use_cache: bool = True,
+    deadline_sec: float | None = None,
+) -> AsyncIterator[str]:
+    client = _async_openai_client()
+    if client is None:
+        return
+    request = _response_request(system_prompt, user_prompt, history)
+    key = llm_cache.cache_key_for(request, use_cache)
+    if key is not None:
+        cached = await llm_cache.alookup(key)
+        if cached is not None:
+            yield cached
+            return
+    if not await resilience.breaker.aallow() or not await aadmit("llm", tenant_id):
+        return
+
+    # the deadline covers opening the stream (retried like any call); once text has
+    # been sent there is no retry, and each later chunk is bounded by the read timeout
+    deadline = time.monotonic() + (deadline_sec or settings.llm_deadline_sec)
+    attempt = 0
+    while True:
+        remaining = deadline - time.monotonic()
+        try:
+            stream = await asyncio.wait_for(
+                client.responses.create(**request, stream=True, timeout=remaining), remaining
+            )
+            break
+        except Exception as exc:
+            delay = resilience.retry_delay(attempt, deadline) if await resilience.arecord_failure(exc) else None
+            if delay is None:
+                return
+            await asyncio.sleep(delay)
+            attempt += 1
+    parts = []
+    try:
+        async for event in stream:
+            if event.type == "response.output_text.delta":
+                parts.append(event.delta)
+                yield event.delta
+    except Exception as exc:
+        await resilience.arecord_failure(exc)
+        if parts:
+            raise StreamInterrupted("provider stream failed after partial output") from exc
+        return
+    await resilience.arecord_success()
+    # only complete streams are cached
+    if key is not None and parts:
+        await llm_cache.astore(key, "".join(parts))
+
 
-def generate_llm_draft(lead_summary: str | None, context_docs: Iterable[str] | None = None) -> str:
+def generate_llm_draft(
+    lead_summary: str | None,
+    context_docs: Iterable[str] | None = None,
+    tenant_id: int | None = None,
+    use_cache: bool = True,
+    deadline_sec: float | None = None,
+) -> str:
     summary = (lead_summary or "").strip()
     docs = "\n".join(context_docs) if context_docs else ""
 
@@ -50,7 +284,9 @@ def generate_llm_draft(lead_summary: str | None, context_docs: Iterable[str] | N
     )
     user_prompt = f"Lead summary: {summary or 'No summary provided.'}\n\nContext:\n{docs}".strip()
 
-    result = _generate_with_openai(system_prompt, user_prompt)
+    result = _generate_with_openai(
+        system_prompt, user_prompt, tenant_id, use_cache=use_cache, deadline_sec=deadline_sec
+    )
     if result:
         return result
 
@@ -71,10 +307,46 @@ def generate_llm_draft(lead_summary: str | None, context_docs: Iterable[str] | N
     )
 
 
-def generate_llm_reply(message: str, system_override: str | None = None) -> str | None:
-    system_prompt = system_override or (
-        "You are a ClientOps chat assistant. Respond in 3-6 short sentences. Be clear and helpful. "
-        "Ask exactly one clarifying question. If the user asks about services, list 3-5 service bullets "
-        "and end with the clarifying question."
+def generate_llm_reply(
+    message: str,
+    system_override: str | None = None,
+    tenant_id: int | None = None,
+    history: list[dict] | None = None,
+    use_cache: bool = True,
+    deadline_sec: float | None = None,
+) -> str | None:
+    return _generate_with_openai(
+        system_override or CHAT_SYSTEM_PROMPT, message, tenant_id, history, use_cache, deadline_sec
+    )
+
+
+async def agenerate_llm_reply(
+    message: str,
+    system_override: str | None = None,
+    tenant_id: int | None = None,
+    history: list[dict] | None = None,
+    use_cache: bool = True,
+    deadline_sec: float | None = None,
+) -> str | None:
+    return await _agenerate_with_openai(
+        system_override or CHAT_SYSTEM_PROMPT, message, tenant_id, history, use_cache, deadline_sec
+    )
+
+
+def astream_llm_reply(
+    message: str,
+    system_override: str | None = None,
+    tenant_id: int | None = None,
+    history: list[dict] | None = None,
+    use_cache: bool = True,
+    deadline_sec: float | None = None,
+) -> AsyncIterator[str]:
+    """Text deltas as the model produces them; yields nothing when no LLM is available or admitted.
+
+    A cached response arrives as a single delta. Raises StreamInterrupted if the
+    provider fails after some text was yielded, so callers never take a truncated
+    reply for a complete one.
+    """
+    return _astream_with_openai(
+        system_override or CHAT_SYSTEM_PROMPT, message, tenant_id, history, use_cache, deadline_sec
     )
-    return _generate_with_openai(system_prompt, message)
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import json
+
+from redis.exceptions import RedisError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.models.crm import Conversation, Message
+from core.redis_pool import get_async_redis, get_redis
+
+CONTEXT_ROLES = ("user", "assistant")  # system notes (drafts, approvals) stay out of prompts
+
+
+def approx_tokens(text: str) -> int:
+    # ~4 characters per token for English text; only used to bound prompt size
+    return len(text) // 4 + 1
+
+
+def _tail_query(tenant_id: int, session_id: str, before_id: int | None = None):
+    # newest messages first, served by ix_messages_conversation_id_id without touching older rows
+    conversation_id = (
+        select(Conversation.id)
+        .where(Conversation.tenant_id == tenant_id, Conversation.session_id == session_id)
+        .scalar_subquery()
+    )
+    stmt = select(Message.id, Message.role, Message.content).where(
+        Message.conversation_id == conversation_id,
+        Message.tenant_id == tenant_id,
+        Message.role.in_(CONTEXT_ROLES),
+    )
+    if before_id is not None:
+        stmt = stmt.where(Message.id < before_id)
+    return stmt.order_by(Message.id.desc()).limit(settings.llm_context_messages)
+
+
+def _tail_rows(result) -> list[dict]:
+    # no single turn can use more than the whole budget, so longer texts are cut before caching
+    max_chars = max(0, settings.llm_context_token_budget - 1) * 4
+    return [{"id": row.id, "role": row.role, "content": (row.content or "")[-max_chars:]} for row in result]
+
+
+def trim_to_budget(rows: list[dict], budget: int) -> list[dict]:
+    """Newest-first rows -> the most recent turns that fit in `budget` tokens, oldest first."""
+    turns = []
+    used = 0
+    for row in rows:
+        cost = approx_tokens(row["content"])
+        if used + cost > budget:
+            break
+        turns.append({"role": row["role"], "content": row["content"]})
+        used += cost
+    turns.reverse()
+    return turns
+
+
+def format_transcript(turns: list[dict]) -> str:
+    return "\n".join(f"{t['role']}: {t['content']}" for t in turns)
+
+
+# Cached tails are stored with the session's context version; appending a message
+# bumps the version, so an entry computed before the append can never be served.
+# Storing an entry pushes the version key's expiry past the entry's, so the version
+# can't lapse and restart at a number an old entry still carries.
+def _keys(tenant_id: int, session_id: str) -> tuple[str, str]:
+    return f"ctx:v:{tenant_id}:{session_id}", f"ctx:{tenant_id}:{session_id}"
+
+
+def _cached_rows(raw_version, raw_entry) -> tuple[str, list[dict] | None]:
+    version = (raw_version or b"0").decode()
+    if raw_entry is not None:
+        entry = json.loads(raw_entry)
+        if entry["v"] == version:
+            return version, entry["rows"]
+    return version, None
+
+
+def _entry(version: str, rows: list[dict]) -> str:
+    return json.dumps({"v": version, "rows": rows})
+
+
+def _queue_store(pipe, vkey: str, key: str, version: str, rows: list[dict]) -> None:
+    ttl = settings.llm_context_cache_ttl_sec
+    pipe.set(key, _entry(version, rows), ex=ttl)
+    pipe.expire(vkey, ttl * 2)
+
+
+def conversation_context(
+    db: Session, tenant_id: int, session_id: str | None, before_id: int | None = None
+) -> list[dict]:
+    """Recent user/assistant turns of a session as [{role, content}], oldest first.
+
+    At most settings.llm_context_messages rows are read, by one tail query, and
+    trimmed to settings.llm_context_token_budget. `before_id` excludes that
+    message and anything newer (the message being answered); such reads skip the
+    cache, which only holds the session's latest tail.
+    """
+    if not session_id or settings.llm_context_messages <= 0:
+        return []
+    if before_id is not None:
+        rows = _tail_rows(db.execute(_tail_query(tenant_id, session_id, before_id)))
+        return trim_to_budget(rows, settings.llm_context_token_budget)
+    vkey, key = _keys(tenant_id, session_id)
+    version = rows = None
+    try:
+        version, rows = _cached_rows(*get_redis("cache").mget([vkey, key]))
+    except RedisError:
+        pass
+    if rows is None:
+        rows = _tail_rows(db.execute(_tail_query(tenant_id, session_id)))
+        if version is not None:
+            try:
+                pipe = get_redis("cache").pipeline(transaction=False)
+                _queue_store(pipe, vkey, key, version, rows)
+                pipe.execute()
+            except RedisError:
+                pass
+    return trim_to_budget(rows, settings.llm_context_token_budget)
+
+
+async def aconversation_context(
+    db: AsyncSession, tenant_id: int, session_id: str | None, before_id: int | None = None
+) -> list[dict]:
+    """conversation_context() for async endpoints."""
+    if not session_id or settings.llm_context_messages <= 0:
+        return []
+    if before_id is not None:
+        rows = _tail_rows(await db.execute(_tail_query(tenant_id, session_id, before_id)))
+        return trim_to_budget(rows, settings.llm_context_token_budget)
+    vkey, key = _keys(tenant_id, session_id)
+    version = rows = None
+    try:
+        version, rows = _cached_rows(*await get_async_redis("cache").mget([vkey, key]))
+    except RedisError:
+        pass
+    if rows is None:
+        rows = _tail_rows(await db.execute(_tail_query(tenant_id, session_id)))
+        if version is not None:
+            try:
+                pipe = get_async_redis("cache").pipeline(transaction=False)
+                _queue_store(pipe, vkey, key, version, rows)
+                await pipe.execute()
+            except RedisError:
+                pass
+    return trim_to_budget(rows, settings.llm_context_token_budget)
+
+
+def invalidate_context(tenant_id: int, session_id: str) -> None:
+    """Call after committing a message to the session."""
+    vkey, key = _keys(tenant_id, session_id)
+    try:
+        pipe = get_redis("cache").pipeline(transaction=False)
+        pipe.incr(vkey)
+        pipe.expire(vkey, settings.llm_context_cache_ttl_sec * 2)
+        pipe.delete(key)
+        pipe.execute()
+    except RedisError:
+        pass
+
+
+async def ainvalidate_context(tenant_id: int, session_id: str) -> None:
+    """invalidate_context() for async endpoints."""
+    vkey, key = _keys(tenant_id, session_id)
+    try:
+        pipe = get_async_redis("cache").pipeline(transaction=False)
+        pipe.incr(vkey)
+        pipe.expire(vkey, settings.llm_context_cache_ttl_sec * 2)
+        pipe.delete(key)
+        await pipe.execute()
+    except RedisError:
+        pass
@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import threading
+import time
+
+from redis.exceptions import RedisError
+
+from core.config import settings
+from core.redis_pool import get_async_redis, get_redis
+
+# set while the breaker is open in any process; RQ work horses are forked per job
+# and would otherwise always start closed
+_SHARED_OPEN_KEY = "llm:breaker:open"
+
+
+def is_provider_error(exc: BaseException) -> bool:
+    """Timeouts, connection failures, 429s and 5xx: worth a retry, and counted by the breaker."""
+    if isinstance(exc, (TimeoutError, asyncio.TimeoutError)):
+        return True
+    try:
+        import openai
+    except Exception:
+        return False
+    return isinstance(exc, (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError))
+
+
+def retry_delay(attempt: int, deadline: float) -> float | None:
+    """Full-jitter exponential backoff before the next attempt, or None to give up.
+
+    Gives up after settings.llm_max_retries retries, when the sleep would run past
+    the call's deadline, or once the breaker has opened.
+    """
+    if attempt >= settings.llm_max_retries or breaker.state != "closed":
+        return None
+    delay = random.uniform(0, min(settings.llm_retry_max_sec, settings.llm_retry_base_sec * 2**attempt))
+    if time.monotonic() + delay >= deadline:
+        return None
+    return delay
+
+
+class CircuitBreaker:
+    """Skips the provider for a cool-down after `failures` consecutive provider errors.
+
+    closed -> open on the threshold; once the cool-down has passed one call is let
+    through (half-open): success closes the breaker, failure opens it again. A probe
+    that never reports back is replaced after another cool-down.
+
+    While closed, whether another process holds the breaker open is checked at most
+    every SHARED_CHECK_SEC.
+    """
+
+    SHARED_CHECK_SEC = 1.0
+
+    def __init__(self, failures: int, cooldown_sec: float):
+        self.failures = failures
+        self.cooldown_sec = cooldown_sec
+        self.state = "closed"
+        self._lock = threading.Lock()
+        self._consecutive = 0
+        self._retry_at = 0.0  # monotonic time after which open/half_open admit a probe
+        self._opened = 0
+        self._short_circuited = 0
+        self._shared_checked_at = float("-inf")
+
+    def _local_allow(self, now: float) -> bool:
+        if self.state == "closed":
+            return True
+        if now < self._retry_at:
+            self._short_circuited += 1
+            return False
+        self.state = "half_open"
+        self._retry_at = now + self.cooldown_sec
+        return True
+
+    def _skip_shared_check(self, now: float) -> bool:
+        # caller holds the lock
+        if now - self._shared_checked_at < self.SHARED_CHECK_SEC:
+            return True
+        self._shared_checked_at = now
+        return False
+
+    def _adopt_shared(self, now: float, ttl_ms: int) -> None:
+        # another process opened the breaker
+        self.state = "open"
+        self._retry_at = now + ttl_ms / 1000
+        self._short_circuited += 1
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if self.state != "closed":
+                return self._local_allow(now)
+            if self._skip_shared_check(now):
+                return True
+        try:
+            ttl_ms = get_redis("cache").pttl(_SHARED_OPEN_KEY)
+        except RedisError:
+            return True
+        if ttl_ms > 0:
+            with self._lock:
+                self._adopt_shared(now, ttl_ms)
+            return False
+        return True
+
+    async def aallow(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if self.state != "closed":
+                return self._local_allow(now)
+            if self._skip_shared_check(now):
+                return True
+        try:
+            ttl_ms = await get_async_redis("cache").pttl(_SHARED_OPEN_KEY)
+        except RedisError:
+            return True
+        if ttl_ms > 0:
+            with self._lock:
+                self._adopt_shared(now, ttl_ms)
+            return False
+        return True
+
+    def record_success(self) -> bool:
+        """Reset the failure count; True if this closed an open or half-open breaker."""
+        with self._lock:
+            reopened = self.state != "closed"
+            self.state = "closed"
+            self._consecutive = 0
+            return reopened
+
+    def resolve_probe(self) -> bool:
+        """A call failed for a reason that says nothing about the provider's health.
+
+        The provider got as far as answering, so a pending half-open probe counts
+        as a success; True if this closed the breaker.
+        """
+        with self._lock:
+            if self.state != "half_open":
+                return False
+            self.state = "closed"
+            self._consecutive = 0
+            return True
+
+    def record_failure(self) -> bool:
+        """Count a provider error; True if this opened the breaker (caller publishes it)."""
+        with self._lock:
+            self._consecutive += 1
+            if self.state == "half_open" or (self.state == "closed" and self._consecutive >= self.failures):
+                self.state = "open"
+                self._retry_at = time.monotonic() + self.cooldown_sec
+                self._opened += 1
+                return True
+            return False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            retry_in = max(0.0, self._retry_at - time.monotonic()) if self.state != "closed" else 0.0
+            return {
+                "state": self.state,
+                "consecutive_failures": self._consecutive,
+                "retry_in_sec": round(retry_in, 1),
+                "opened": self._opened,
+                "short_circuited": self._short_circuited,
+                "failure_threshold": self.failures,
+                "cooldown_sec": self.cooldown_sec,
+            }
+
+
+breaker = CircuitBreaker(settings.llm_breaker_failures, settings.llm_breaker_cooldown_sec)
+
+
+def record_success() -> None:
+    if breaker.record_success():
+        try:
+            get_redis("cache").delete(_SHARED_OPEN_KEY)
+        except RedisError:
+            pass
+
+
+async def arecord_success() -> None:
+    if breaker.record_success():
+        try:
+            await get_async_redis("cache").delete(_SHARED_OPEN_KEY)
+        except RedisError:
+            pass
+
+
+def record_failure(exc: BaseException) -> bool:
+    """Feed an exception from a provider call to the breaker; True if worth retrying.
+
+    Other errors (bad requests, auth) don't count as failures but still end a
+    half-open probe, which would otherwise keep the breaker half-open.
+    """
+    if not is_provider_error(exc):
+        if breaker.resolve_probe():
+            try:
+                get_redis("cache").delete(_SHARED_OPEN_KEY)
+            except RedisError:
+                pass
+        return False
+    if breaker.record_failure():
+        try:
+            get_redis("cache").set(_SHARED_OPEN_KEY, "1", px=int(breaker.cooldown_sec * 1000))
+        except RedisError:
+            pass
+    return True
+
+
+async def arecord_failure(exc: BaseException) -> bool:
+    """record_failure() for async callers."""
+    if not is_provider_error(exc):
+        if breaker.resolve_probe():
+            try:
+                await get_async_redis("cache").delete(_SHARED_OPEN_KEY)
+            except RedisError:
+                pass
+        return False
+    if breaker.record_failure():
+        try:
+            await get_async_redis("cache").set(_SHARED_OPEN_KEY, "1", px=int(breaker.cooldown_sec * 1000))
+        except RedisError:
+            pass
+    return True
+
+
+def breaker_state() -> dict:
+    """This process's breaker plus whether any process currently holds it open."""
+    state = breaker.snapshot()
+    try:
+        state["shared_open_sec"] = max(0, get_redis("cache").pttl(_SHARED_OPEN_KEY)) / 1000
+    except RedisError:
+        state["shared_open_sec"] = None
+    return state
@@ -1,2 +1,3 @@
 from .health import HealthCheck
 from .actions import ActionLog
+from .analytics import IntentDailyCount, MetricsHourly, RollupWatermark
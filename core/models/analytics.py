@@ -0,0 +1,40 @@
+from datetime import date, datetime
+
+from sqlalchemy import Date, DateTime, Float, ForeignKey, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from core.db import Base
+
+
+class IntentDailyCount(Base):
+    __tablename__ = "intent_daily_counts"
+
+    tenant_id: Mapped[int] = mapped_column(ForeignKey("tenants.id"), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    intent: Mapped[str] = mapped_column(String(20), primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class MetricsHourly(Base):
+    __tablename__ = "metrics_hourly"
+
+    tenant_id: Mapped[int] = mapped_column(ForeignKey("tenants.id"), primary_key=True)
+    hour: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+
+    messages: Mapped[int] = mapped_column(Integer, default=0)
+    leads_created: Mapped[int] = mapped_column(Integer, default=0)
+    tickets_created: Mapped[int] = mapped_column(Integer, default=0)
+    drafts_created: Mapped[int] = mapped_column(Integer, default=0)
+    drafts_approved: Mapped[int] = mapped_column(Integer, default=0)
+    drafts_rejected: Mapped[int] = mapped_column(Integer, default=0)
+    first_response_sum_sec: Mapped[float] = mapped_column(Float, default=0.0)
+    first_response_count: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class RollupWatermark(Base):
+    __tablename__ = "rollup_watermarks"
+
+    # one row per source stream: messages, leads, tickets, automation_drafts, draft_decisions
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    last_id: Mapped[int] = mapped_column(Integer, default=0)
+    last_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
@@ -12,6 +12,8 @@ class Tenant(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     name: Mapped[str] = mapped_column(String(150))
+    # bumped on every taxonomy_keywords write; processes poll it to hot-reload classifiers
+    taxonomy_version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 
@@ -54,9 +56,23 @@ class Conversation(Base):
     channel: Mapped[str] = mapped_column(String(50), default="web")
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
+    # denormalized from messages so SLA / response-time analytics never read transcripts
+    first_user_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    first_assistant_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    last_message_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
     contact: Mapped["Contact | None"] = relationship(back_populates="conversations")
     messages: Mapped[list["Message"]] = relationship(back_populates="conversation")
 
+    def record_message(self, role: str, at: datetime) -> None:
+        """Keep first-response / activity timestamps current; call whenever a Message is added."""
+        if role == "user" and self.first_user_at is None:
+            self.first_user_at = at
+        elif role == "assistant" and self.first_user_at is not None and self.first_assistant_at is None:
+            self.first_assistant_at = at
+        if self.last_message_at is None or at > self.last_message_at:
+            self.last_message_at = at
+
 
 class Message(Base):
     __tablename__ = "messages"
@@ -67,10 +83,14 @@ class Message(Base):
 
     role: Mapped[str] = mapped_column(String(20))  # user/assistant/system
     content: Mapped[str] = mapped_column(Text)
+    intent: Mapped[str | None] = mapped_column(String(20), nullable=True)  # lead/ticket/general, user msgs only
+    # assistant replies point at the user message they answer; unique, so racing reply jobs can't both land
+    reply_to_id: Mapped[int | None] = mapped_column(ForeignKey("messages.id"), nullable=True, index=True, unique=True)
 
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
     conversation: Mapped["Conversation"] = relationship(back_populates="messages")
+    reply_to: Mapped["Message | None"] = relationship(remote_side=[id])
 
 
 class Lead(Base):
@@ -160,6 +180,7 @@ class AutomationDraft(Base):
 
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     approved_at = Column(DateTime(timezone=True), nullable=True)
+    rejected_at = Column(DateTime(timezone=True), nullable=True)
 
     # relationships (optional)
     lead = relationship("Lead", backref="drafts", lazy="joined")
@@ -180,3 +201,15 @@ class LeadScoreRule(Base):
     points: Mapped[int] = mapped_column(Integer)
     active: Mapped[bool] = mapped_column(Boolean, default=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class TaxonomyKeyword(Base):
+    __tablename__ = "taxonomy_keywords"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    tenant_id: Mapped[int] = mapped_column(ForeignKey("tenants.id"), index=True)
+    dimension: Mapped[str] = mapped_column(String(30))  # intent | tag | sentiment | urgency | topic | ...
+    label: Mapped[str] = mapped_column(String(100))
+    rank: Mapped[int] = mapped_column(Integer, default=0)  # lower rank wins when several labels match
+    keyword: Mapped[str] = mapped_column(String(255))
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from redis.exceptions import RedisError
+
+from core.redis_pool import get_async_redis, get_redis
+
+# without Redis, waiters fall back to re-checking the database at this interval
+FALLBACK_POLL_SEC = 1.0
+
+
+def _channel(tenant_id: int, session_id: str) -> str:
+    return f"conversation:{tenant_id}:{session_id}"
+
+
+def notify_conversation(tenant_id: int, session_id: str) -> None:
+    """Wake long-polls on this conversation. Call after commit."""
+    try:
+        get_redis("cache").publish(_channel(tenant_id, session_id), "1")
+    except RedisError:
+        pass
+
+
+class ConversationUpdates:
+    def __init__(self, pubsub=None):
+        self._pubsub = pubsub
+
+    async def wait(self, timeout: float) -> None:
+        """Return on the next notification, or after `timeout` seconds."""
+        if self._pubsub is None:
+            await asyncio.sleep(min(timeout, FALLBACK_POLL_SEC))
+            return
+        try:
+            await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        except RedisError:
+            self._pubsub = None
+            await asyncio.sleep(min(timeout, FALLBACK_POLL_SEC))
+
+
+@asynccontextmanager
+async def conversation_updates(tenant_id: int, session_id: str) -> AsyncIterator[ConversationUpdates]:
+    """Subscribe before reading the conversation so no notification can be missed in between."""
+    pubsub = None
+    try:
+        pubsub = get_async_redis("pubsub").pubsub()
+        await pubsub.subscribe(_channel(tenant_id, session_id))
+    except RedisError:
+        pubsub = None
+    try:
+        yield ConversationUpdates(pubsub)
+    finally:
+        if pubsub is not None:
+            try:
+                await pubsub.aclose()
+            except RedisError:
+                pass
@@ -1,8 +1,80 @@
-import os
-from redis import Redis
+from __future__ import annotations
+
+import asyncio
+
 from rq import Queue
+from rq.job import Job, JobStatus
+
+from core.redis_pool import get_redis
+
+# A job id that is still waiting to run is an idempotency key: triggering it again
+# changes nothing. A job that is already running may have read its inputs before
+# the trigger, so one follow-up run is queued under "<id>:rerun" instead, which
+# collapses the same way. Only while both are running is a trigger dropped.
+_WAITING = {JobStatus.QUEUED, JobStatus.DEFERRED, JobStatus.SCHEDULED}
+
 
 def get_queue() -> Queue:
-    redis_url = os.getenv("REDIS_URL", "redis://redis:6379/0")
-    conn = Redis.from_url(redis_url)
-    return Queue("default", connection=conn)
+    return Queue("default", connection=get_redis())
+
+
+def _rerun_id(job_id: str) -> str:
+    return f"{job_id}:rerun"
+
+
+def _target_id(job_id: str, existing: dict[str, Job]) -> tuple[str, bool]:
+    """(id to report, whether to enqueue under it) for a deterministic job id."""
+    main, rerun = existing.get(job_id), existing.get(_rerun_id(job_id))
+    main_status = main.get_status(refresh=False) if main is not None else None
+    rerun_status = rerun.get_status(refresh=False) if rerun is not None else None
+    if main_status in _WAITING:
+        return job_id, False
+    if rerun_status in _WAITING:
+        return _rerun_id(job_id), False
+    if main_status != JobStatus.STARTED:
+        return job_id, True
+    if rerun_status == JobStatus.STARTED:
+        return job_id, False
+    return _rerun_id(job_id), True
+
+
+def enqueue_jobs(jobs: list[tuple[str | None, str, tuple]], job_timeout: int | None = None) -> list[str]:
+    """Enqueue (job_id, func_name, args) jobs; returns the id each one is queued (or waiting) under.
+
+    One round trip reads the state of every deterministic id, then rq's
+    enqueue_many writes the jobs in one pipeline. The check and the write aren't
+    atomic, so two processes racing on the same finished id can both enqueue it;
+    repeated triggers from one caller always collapse.
+    """
+    if not jobs:
+        return []
+    queue = get_queue()
+    ids = [job_id for job_id, _, _ in jobs if job_id is not None]
+    lookup = [i for job_id in ids for i in (job_id, _rerun_id(job_id))]
+    existing = {job.id: job for job in Job.fetch_many(lookup, connection=queue.connection) if job is not None}
+
+    queued, to_enqueue = [], {}
+    for i, (job_id, func_name, args) in enumerate(jobs):
+        enqueue = True
+        if job_id is not None:
+            job_id, enqueue = _target_id(job_id, existing)
+        if enqueue:
+            to_enqueue[i] = Queue.prepare_data(func_name, args=args, timeout=job_timeout, job_id=job_id)
+        queued.append(job_id)
+    if to_enqueue:
+        # jobs without a deterministic id get theirs from rq
+        for i, job in zip(to_enqueue, queue.enqueue_many(list(to_enqueue.values()))):
+            queued[i] = job.id
+    return queued
+
+
+def enqueue_unique(func_name: str, *args, job_id: str, job_timeout: int | None = None) -> str:
+    """Enqueue one job under a deterministic id, unless that job is still waiting to run."""
+    return enqueue_jobs([(job_id, func_name, args)], job_timeout=job_timeout)[0]
+
+
+async def aenqueue_jobs(jobs: list[tuple[str | None, str, tuple]], job_timeout: int | None = None) -> list[str]:
+    """enqueue_jobs() for async code; rq's client is synchronous, so it runs in a thread."""
+    if not jobs:
+        return []
+    return await asyncio.to_thread(enqueue_jobs, jobs, job_timeout)
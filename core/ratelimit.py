@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import Counter
+
+from redis.exceptions import RedisError
+
+from core.config import settings
+from core.redis_pool import get_async_redis, get_redis
+
+KINDS = ("chat", "llm")
+
+# Takes one token from every bucket in KEYS, or from none of them.
+# ARGV: cost, then (rate, burst) per key. Uses the Redis clock so API and worker
+# processes agree on refill time. Returns {allowed, index of the denying bucket}.
+_TAKE_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local cost = tonumber(ARGV[1])
+local levels = {}
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[2 * i])
+    local burst = tonumber(ARGV[2 * i + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+    if tokens < cost then
+        return {0, i}
+    end
+    levels[i] = tokens
+end
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[2 * i])
+    local burst = tonumber(ARGV[2 * i + 1])
+    redis.call('HSET', key, 'tokens', tostring(levels[i] - cost), 'ts', tostring(now))
+    redis.call('EXPIRE', key, math.ceil(burst / rate) + 1)
+end
+return {1, 0}
+"""
+
+
+class TokenBucket:
+    """In-process bucket, used when Redis is unreachable (limits then apply per process)."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.ts = time.monotonic()
+
+    def level(self, now: float) -> float:
+        return min(self.burst, self.tokens + max(0.0, now - self.ts) * self.rate)
+
+
+_local: dict[str, TokenBucket] = {}
+_local_lock = threading.Lock()
+_stats: Counter = Counter()  # "<kind>:<admitted|throttled|local>" for this process
+_script = None
+_async_script = None
+
+
+def _buckets(kind: str, tenant_id: int | None) -> list[tuple[str, float, float]]:
+    buckets = [(f"rl:{kind}:global", getattr(settings, f"{kind}_global_rate"), getattr(settings, f"{kind}_global_burst"))]
+    if tenant_id is not None:
+        buckets.insert(
+            0,
+            (f"rl:{kind}:t:{tenant_id}", getattr(settings, f"{kind}_tenant_rate"), getattr(settings, f"{kind}_tenant_burst")),
+        )
+    return buckets
+
+
+def _script_args(buckets, cost: float) -> tuple[list[str], list[float]]:
+    keys = [k for k, _, _ in buckets]
+    args = [cost]
+    for _, rate, burst in buckets:
+        args += [rate, burst]
+    return keys, args
+
+
+def _take_local(buckets, cost: float) -> bool:
+    now = time.monotonic()
+    with _local_lock:
+        state = [_local.setdefault(k, TokenBucket(rate, burst)) for k, rate, burst in buckets]
+        levels = [b.level(now) for b in state]
+        if any(level < cost for level in levels):
+            return False
+        for bucket, level in zip(state, levels):
+            bucket.tokens, bucket.ts = level - cost, now
+        return True
+
+
+def _record(kind: str, allowed: bool, local: bool) -> bool:
+    _stats[f"{kind}:{'admitted' if allowed else 'throttled'}"] += 1
+    if local:
+        _stats[f"{kind}:local"] += 1
+    return allowed
+
+
+def admit(kind: str, tenant_id: int | None, cost: float = 1.0) -> bool:
+    """Take `cost` tokens from the tenant's and the global `kind` bucket, all or nothing.
+
+    False means over budget: callers answer without the model instead of waiting.
+    """
+    if not settings.ratelimit_enabled:
+        return True
+    global _script
+    buckets = _buckets(kind, tenant_id)
+    keys, args = _script_args(buckets, cost)
+    try:
+        if _script is None:
+            _script = get_redis("cache").register_script(_TAKE_LUA)
+        allowed, _ = _script(keys=keys, args=args)
+        return _record(kind, bool(allowed), local=False)
+    except RedisError:
+        return _record(kind, _take_local(buckets, cost), local=True)
+
+
+async def aadmit(kind: str, tenant_id: int | None, cost: float = 1.0) -> bool:
+    """admit() for async callers."""
+    if not settings.ratelimit_enabled:
+        return True
+    global _async_script
+    buckets = _buckets(kind, tenant_id)
+    keys, args = _script_args(buckets, cost)
+    try:
+        if _async_script is None:
+            _async_script = get_async_redis("cache").register_script(_TAKE_LUA)
+        allowed, _ = await _async_script(keys=keys, args=args)
+        return _record(kind, bool(allowed), local=False)
+    except RedisError:
+        return _record(kind, _take_local(buckets, cost), local=True)
+
+
+def limiter_state(tenant_id: int) -> dict:
+    """Current fill of the tenant's and global buckets plus this process's admit counters."""
+    state = {"enabled": settings.ratelimit_enabled}
+    now = time.time()
+    for kind in KINDS:
+        buckets = _buckets(kind, tenant_id)
+        levels = {}
+        try:
+            pipe = get_redis("cache").pipeline(transaction=False)
+            for key, _, _ in buckets:
+                pipe.hmget(key, "tokens", "ts")
+            rows = pipe.execute()
+        except RedisError:
+            rows = None
+        for i, (key, rate, burst) in enumerate(buckets):
+            scope = "tenant" if ":t:" in key else "global"
+            if rows is None:
+                bucket = _local.get(key)
+                tokens = bucket.level(time.monotonic()) if bucket is not None else burst
+            elif rows[i][0] is None:
+                tokens = burst
+            else:
+                tokens = min(burst, float(rows[i][0]) + max(0.0, now - float(rows[i][1])) * rate)
+            levels[scope] = {"tokens": round(tokens, 2), "burst": burst, "rate_per_sec": rate}
+        state[kind] = {
+            **levels,
+            "admitted": _stats[f"{kind}:admitted"],
+            "throttled": _stats[f"{kind}:throttled"],
+            "local_fallback": _stats[f"{kind}:local"],
+        }
+    return state
@@ -0,0 +1,50 @@
+"""Process-wide Redis clients shared by the API and the worker.
+
+Each role gets one client per process, and so one connection pool. Clients are
+safe to share across threads. redis-py pools notice a fork and reconnect in the
+child, so RQ work horses inherit them safely.
+"""
+
+from __future__ import annotations
+
+import threading
+
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+
+from core.config import settings
+
+_OPTIONS: dict[str, dict] = {
+    # RQ: blocking pops and long jobs, so no read timeout
+    "queue": {"socket_connect_timeout": 5, "health_check_interval": 30},
+    # caches, counters and limiters are best effort: fail fast and fall back
+    "cache": {"socket_timeout": 0.25, "socket_connect_timeout": 0.25},
+    # pub/sub listeners block until a message arrives
+    "pubsub": {"socket_connect_timeout": 0.25},
+}
+
+_clients: dict[str, Redis] = {}
+_async_clients: dict[str, AsyncRedis] = {}
+_lock = threading.Lock()
+
+
+def redis_url() -> str:
+    return settings.redis_url
+
+
+def get_redis(role: str = "queue") -> Redis:
+    client = _clients.get(role)
+    if client is None:
+        with _lock:
+            client = _clients.get(role)
+            if client is None:
+                client = _clients[role] = Redis.from_url(redis_url(), **_OPTIONS[role])
+    return client
+
+
+def get_async_redis(role: str = "queue") -> AsyncRedis:
+    # async code runs on the single event-loop thread, no lock needed
+    client = _async_clients.get(role)
+    if client is None:
+        client = _async_clients[role] = AsyncRedis.from_url(redis_url(), **_OPTIONS[role])
+    return client
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import Counter
+
+from redis.exceptions import RedisError
+
+from core.cache import MISS, LRUCache
+from core.config import settings
+from core.redis_pool import get_async_redis, get_redis
+
+_local = LRUCache(settings.reply_cache_local_size)
+_stats: Counter = Counter()  # this process: local_hits, shared_hits, misses, stores
+_stats_lock = threading.Lock()
+
+_PUNCT_TAIL = re.compile(r"[\s?!.,;:]+$")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize(message: str) -> str:
+    """Case, inner whitespace and trailing punctuation don't change the question."""
+    return _PUNCT_TAIL.sub("", _SPACES.sub(" ", (message or "").strip().lower()))
+
+
+def reply_key(
+    tenant_id: int | None,
+    message: str,
+    system_prompt: str,
+    fingerprint: str = "",
+    history: list[dict] | None = None,
+) -> str | None:
+    """Cache key for an LLM reply, or None if this message should not be cached.
+
+    `fingerprint` identifies everything else the reply depends on (service catalog,
+    prompt set); when any of it changes, old entries simply stop being addressed.
+    Conversation `history` sent with the prompt is part of the key, so only opening
+    messages are shared across sessions.
+    """
+    text = normalize(message)
+    if not settings.reply_cache_enabled or tenant_id is None or not text or len(text) > settings.reply_cache_max_chars:
+        return None
+    parts = [settings.llm_model, fingerprint, system_prompt, text]
+    if history:
+        parts.append(json.dumps([[t["role"], t["content"]] for t in history]))
+    digest = hashlib.sha1("\0".join(parts).encode()).hexdigest()
+    return f"reply:{tenant_id}:{digest}"
+
+
+def _tenant_of(key: str) -> str:
+    return key.split(":", 2)[1]
+
+
+def _index_key(tenant: str | int) -> str:
+    return f"reply:idx:{tenant}"
+
+
+def _stats_key(tenant: str | int) -> str:
+    return f"reply:stats:{tenant}"
+
+
+def _count(name: str) -> None:
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def _evict_overflow(r, tenant: str, size: int) -> None:
+    excess = size - settings.reply_cache_tenant_max
+    if excess > 0:
+        stale = [k for k, _ in r.zpopmin(_index_key(tenant), excess)]
+        if stale:
+            r.delete(*stale)
+
+
+async def _aevict_overflow(r, tenant: str, size: int) -> None:
+    excess = size - settings.reply_cache_tenant_max
+    if excess > 0:
+        stale = [k for k, _ in await r.zpopmin(_index_key(tenant), excess)]
+        if stale:
+            await r.delete(*stale)
+
+
+def get_reply(key: str) -> str | None:
+    value = _local.get(key)
+    if value is not MISS:
+        _count("local_hits")
+        return value
+    try:
+        pipe = get_redis("cache").pipeline(transaction=False)
+        pipe.get(key)
+        pipe.hincrby(_stats_key(_tenant_of(key)), "lookups", 1)
+        raw, _ = pipe.execute()
+    except RedisError:
+        raw = None
+    if raw is None:
+        _count("misses")
+        return None
+    _count("shared_hits")
+    value = raw.decode()
+    _local.set(key, value, settings.reply_cache_local_ttl_sec)
+    return value
+
+
+async def aget_reply(key: str) -> str | None:
+    value = _local.get(key)
+    if value is not MISS:
+        _count("local_hits")
+        return value
+    try:
+        pipe = get_async_redis("cache").pipeline(transaction=False)
+        pipe.get(key)
+        pipe.hincrby(_stats_key(_tenant_of(key)), "lookups", 1)
+        raw, _ = await pipe.execute()
+    except RedisError:
+        raw = None
+    if raw is None:
+        _count("misses")
+        return None
+    _count("shared_hits")
+    value = raw.decode()
+    _local.set(key, value, settings.reply_cache_local_ttl_sec)
+    return value
+
+
+def _store_pipeline(r, key: str, value: str):
+    tenant = _tenant_of(key)
+    pipe = r.pipeline(transaction=False)
+    pipe.set(key, value, ex=settings.reply_cache_ttl_sec)
+    pipe.zadd(_index_key(tenant), {key: time.time()})
+    pipe.expire(_index_key(tenant), settings.reply_cache_ttl_sec)
+    pipe.hincrby(_stats_key(tenant), "stores", 1)
+    pipe.zcard(_index_key(tenant))
+    return pipe
+
+
+def set_reply(key: str, value: str) -> None:
+    _count("stores")
+    _local.set(key, value, settings.reply_cache_local_ttl_sec)
+    try:
+        r = get_redis("cache")
+        size = _store_pipeline(r, key, value).execute()[-1]
+        _evict_overflow(r, _tenant_of(key), size)
+    except RedisError:
+        pass
+
+
+async def aset_reply(key: str, value: str) -> None:
+    _count("stores")
+    _local.set(key, value, settings.reply_cache_local_ttl_sec)
+    try:
+        r = get_async_redis("cache")
+        size = (await _store_pipeline(r, key, value).execute())[-1]
+        await _aevict_overflow(r, _tenant_of(key), size)
+    except RedisError:
+        pass
+
+
+def clear_tenant(tenant_id: int) -> int:
+    """Drop a tenant's shared entries; other processes' local copies expire within reply_cache_local_ttl_sec."""
+    try:
+        r = get_redis("cache")
+        keys = r.zrange(_index_key(tenant_id), 0, -1)
+        if keys:
+            r.delete(*keys)
+        r.delete(_index_key(tenant_id))
+        return len(keys)
+    except RedisError:
+        return 0
+
+
+def reply_cache_stats(tenant_id: int) -> dict:
+    try:
+        shared = {k.decode(): int(v) for k, v in get_redis("cache").hgetall(_stats_key(tenant_id)).items()}
+        entries = get_redis("cache").zcard(_index_key(tenant_id))
+    except RedisError:
+        shared, entries = None, None
+    return {"tenant": {"entries": entries, **(shared or {})}}
+
+
+def reply_cache_process_stats() -> dict:
+    """This process's counters; they add up lookups of every tenant it served."""
+    with _stats_lock:
+        local = dict(_stats)
+    lookups = sum(local.get(k, 0) for k in ("local_hits", "shared_hits", "misses"))
+    hits = local.get("local_hits", 0) + local.get("shared_hits", 0)
+    return {**local, "hit_rate": hits / lookups if lookups else None}
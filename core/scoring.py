@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import defaultdict
+from typing import Callable, Iterable
+
+from sqlalchemy import false, func, literal, or_, select, text
+from sqlalchemy.orm import Session
+
+from core.automaton import build_automaton
+from core.models.crm import Lead, LeadEvent, LeadScoreRule
+
+SCORED_FIELDS = ("summary", "status")
+
+
+def apply_rule(lead: Lead, rule: LeadScoreRule) -> int:
+    """Reference semantics for a single rule; RuleEngine must agree with this."""
+    field_value = ""
+    if rule.field == "summary":
+        field_value = (lead.summary or "").lower()
+    elif rule.field == "status":
+        field_value = (lead.status or "").lower()
+
+    rule_value = (rule.value or "").lower()
+    if rule.operator == "contains" and rule_value in field_value:
+        return rule.points
+    if rule.operator == "equals" and rule_value == field_value:
+        return rule.points
+    return 0
+
+
+class _FieldMatcher:
+    def __init__(self):
+        self.contains: dict[str, int] = defaultdict(int)
+        self.equals: dict[str, int] = defaultdict(int)
+        self.always = 0  # empty `contains` value matches every text
+        self._automaton = None
+
+    def compile(self) -> None:
+        if self.contains:
+            self._automaton = build_automaton(self.contains)
+
+    def score(self, text: str) -> int:
+        points = self.always + self.equals.get(text, 0)
+        if self._automaton is not None and text:
+            points += sum(self.contains[w] for w in self._automaton.matches(text))
+        return points
+
+
+class RuleEngine:
+    """A tenant's active rules compiled into one matcher per field.
+
+    `contains` rules share an Aho-Corasick automaton, `equals` rules are a dict
+    lookup, so a lead is scored in a single pass over each field's text.
+    """
+
+    def __init__(self, rules: Iterable[LeadScoreRule]):
+        self._fields: dict[str, _FieldMatcher] = defaultdict(_FieldMatcher)
+        for rule in rules:
+            field = rule.field if rule.field in SCORED_FIELDS else ""
+            matcher = self._fields[field]
+            value = (rule.value or "").lower()
+            if rule.operator == "contains":
+                if value:
+                    matcher.contains[value] += rule.points
+                else:
+                    matcher.always += rule.points
+            elif rule.operator == "equals":
+                matcher.equals[value] += rule.points
+        for matcher in self._fields.values():
+            matcher.compile()
+
+    def score(self, summary: str | None, status: str | None) -> int:
+        texts = {"summary": summary, "status": status, "": None}
+        return sum(m.score((texts[f] or "").lower()) for f, m in self._fields.items())
+
+    def score_lead(self, lead: Lead) -> int:
+        return self.score(lead.summary, lead.status)
+
+
+def rules_fingerprint(rules: Iterable[LeadScoreRule]) -> str:
+    h = hashlib.sha1()
+    for r in sorted(rules, key=lambda r: r.id or 0):
+        h.update(repr((r.id, r.field, r.operator, r.value, r.points)).encode())
+    return h.hexdigest()
+
+
+_engines: dict[int, tuple[str, RuleEngine]] = {}
+_engines_lock = threading.Lock()
+
+
+def get_rule_engine(db: Session, tenant_id: int) -> RuleEngine:
+    """Compiled engine for the tenant's active rules, rebuilt only when the rule set changes."""
+    rules = (
+        db.query(LeadScoreRule)
+        .filter(LeadScoreRule.active == True, LeadScoreRule.tenant_id == tenant_id)
+        .all()
+    )
+    version = rules_fingerprint(rules)
+    with _engines_lock:
+        hit = _engines.get(tenant_id)
+        if hit is not None and hit[0] == version:
+            return hit[1]
+    engine = RuleEngine(rules)
+    with _engines_lock:
+        _engines[tenant_id] = (version, engine)
+    return engine
+
+
+def rescore_lead(db: Session, lead: Lead) -> bool:
+    """Score one lead inline; logs a score_recomputed event if an existing lead changed.
+
+    A lead's score is the sum of its tenant's active rule points, 0 when there are
+    none, exactly as recompute_tenant_scores() computes it.
+    """
+    new_score = get_rule_engine(db, lead.tenant_id).score_lead(lead)
+    if new_score == lead.score:
+        return False
+    if lead.id is not None:
+        db.add(
+            LeadEvent(
+                lead_id=lead.id,
+                tenant_id=lead.tenant_id,
+                event_type="score_recomputed",
+                old_value=str(lead.score),
+                new_value=str(new_score),
+                actor="system",
+            )
+        )
+    lead.score = new_score
+    return True
+
+
+RECOMPUTE_CHUNK = 5000
+
+# Scores one keyset chunk of a tenant's leads against its active rules, writes only
+# the rows whose score changed, and logs a score_recomputed event for each of them,
+# all in a single statement. Mirrors apply_rule(): empty `contains` values match.
+_RECOMPUTE_CHUNK_SQL = text(
+    """
+    WITH chunk AS (
+        SELECT id, tenant_id, coalesce(score, 0) AS old_score,
+               lower(coalesce(summary, '')) AS summary, lower(coalesce(status, '')) AS status
+        FROM leads
+        WHERE tenant_id = :tenant_id AND id = ANY(:ids)
+    ),
+    scored AS (
+        SELECT c.id, c.tenant_id, c.old_score, coalesce(sum(r.points), 0) AS new_score
+        FROM chunk c
+        LEFT JOIN lead_score_rules r
+          ON r.tenant_id = c.tenant_id
+         AND r.active
+         AND (
+              (r.operator = 'contains' AND position(lower(r.value) IN
+                  CASE r.field WHEN 'summary' THEN c.summary WHEN 'status' THEN c.status ELSE '' END) > 0)
+           OR (r.operator = 'equals' AND lower(r.value) =
+                  CASE r.field WHEN 'summary' THEN c.summary WHEN 'status' THEN c.status ELSE '' END)
+         )
+        GROUP BY c.id, c.tenant_id, c.old_score
+    ),
+    changed AS (
+        UPDATE leads l
+        SET score = s.new_score
+        FROM scored s
+        WHERE l.id = s.id AND coalesce(l.score, 0) <> s.new_score
+        RETURNING l.id, l.tenant_id, s.old_score, s.new_score
+    )
+    INSERT INTO lead_events (tenant_id, lead_id, event_type, old_value, new_value, actor, created_at)
+    SELECT tenant_id, id, 'score_recomputed', old_score::text, new_score::text, 'system', now() AT TIME ZONE 'utc'
+    FROM changed
+    """
+)
+
+
+def rule_predicate(field: str, operator: str, value: str | None):
+    """SQL filter for the leads a single rule matches (same semantics as apply_rule)."""
+    if field == "summary":
+        target = func.lower(func.coalesce(Lead.summary, ""))
+    elif field == "status":
+        target = func.lower(func.coalesce(Lead.status, ""))
+    else:
+        target = literal("")
+    value = (value or "").lower()
+    if operator == "contains":
+        return func.strpos(target, value) > 0
+    if operator == "equals":
+        return target == value
+    return false()
+
+
+def recompute_tenant_scores(
+    db: Session,
+    tenant_id: int,
+    chunk_size: int = RECOMPUTE_CHUNK,
+    on_progress: Callable[[int, int, int], None] | None = None,
+    predicates: list[dict] | None = None,
+) -> dict:
+    """Rescore a tenant's leads in the database, one committed keyset chunk at a time.
+
+    Nothing is loaded into the ORM session and row locks are held for one chunk only.
+    With `predicates` ({field, operator, value} dicts) only leads matching at least one
+    of them are visited. on_progress(done, total, updated) is called after each commit.
+    """
+    filters = [Lead.tenant_id == tenant_id]
+    if predicates is not None:
+        matches = [rule_predicate(p["field"], p["operator"], p["value"]) for p in predicates]
+        filters.append(or_(false(), *matches))
+
+    total = db.execute(select(func.count()).select_from(Lead).where(*filters)).scalar()
+    rules = db.execute(
+        select(func.count())
+        .select_from(LeadScoreRule)
+        .where(LeadScoreRule.active == True, LeadScoreRule.tenant_id == tenant_id)
+    ).scalar()
+
+    done = updated = 0
+    lo = 0
+    while True:
+        ids = db.execute(
+            select(Lead.id).where(*filters, Lead.id > lo).order_by(Lead.id).limit(chunk_size)
+        ).scalars().all()
+        if not ids:
+            break
+        result = db.execute(_RECOMPUTE_CHUNK_SQL, {"tenant_id": tenant_id, "ids": ids})
+        db.commit()
+        done += len(ids)
+        updated += result.rowcount
+        lo = ids[-1]
+        if on_progress is not None:
+            on_progress(done, total, updated)
+
+    return {"ok": True, "updated": updated, "rules": rules, "leads": done}
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import func, literal_column
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from core.models.crm import Contact, Conversation
+
+# true when the row was inserted rather than updated by ON CONFLICT
+_INSERTED = literal_column("(xmax = 0)").label("inserted")
+
+
+def upsert_contact(
+    db: Session,
+    tenant_id: int,
+    email: str,
+    name: str | None = None,
+    company: str | None = None,
+) -> tuple[int, bool]:
+    """Get-or-create a contact by (tenant_id, email) in one statement; returns (id, created).
+
+    Non-null name/company overwrite the stored values, nulls keep them. Joins the
+    caller's transaction; concurrent callers serialize on the unique index instead of
+    failing on it.
+    """
+    stmt = insert(Contact).values(tenant_id=tenant_id, email=email, name=name, company=company)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Contact.tenant_id, Contact.email],
+        set_={
+            "name": func.coalesce(stmt.excluded.name, Contact.name),
+            "company": func.coalesce(stmt.excluded.company, Contact.company),
+        },
+    ).returning(Contact.id, _INSERTED)
+    row = db.execute(stmt).one()
+    return row.id, row.inserted
+
+
+def upsert_conversation(
+    db: Session,
+    tenant_id: int,
+    session_id: str,
+    contact_id: int | None = None,
+    user_at: datetime | None = None,
+    assistant_at: datetime | None = None,
+    channel: str = "web",
+) -> int:
+    """Get-or-create a conversation by (tenant_id, session_id) in one statement; returns its id.
+
+    Also applies Conversation.record_message() for a turn with a user message at
+    `user_at` and, optionally, the assistant reply at `assistant_at`, so the chat path
+    never has to read the row first. A given contact_id replaces the linked contact.
+    """
+    last_at = assistant_at or user_at
+    stmt = insert(Conversation).values(
+        tenant_id=tenant_id,
+        session_id=session_id,
+        channel=channel,
+        contact_id=contact_id,
+        first_user_at=user_at,
+        first_assistant_at=assistant_at if user_at is not None else None,
+        last_message_at=last_at,
+    )
+    set_ = {"contact_id": func.coalesce(stmt.excluded.contact_id, Conversation.contact_id)}
+    if user_at is not None:
+        set_["first_user_at"] = func.coalesce(Conversation.first_user_at, stmt.excluded.first_user_at)
+        set_["first_assistant_at"] = func.coalesce(Conversation.first_assistant_at, stmt.excluded.first_assistant_at)
+    if last_at is not None:
+        set_["last_message_at"] = func.greatest(Conversation.last_message_at, stmt.excluded.last_message_at)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Conversation.tenant_id, Conversation.session_id],
+        set_=set_,
+    ).returning(Conversation.id)
+    return db.execute(stmt).scalar_one()
@@ -0,0 +1,42 @@
+"""Fixtures for the database tests.
+
+Every test runs in an outer transaction that is rolled back afterwards; the code
+under test commits and rolls back savepoints inside it.
+"""
+
+from __future__ import annotations
+
+import os
+
+import pytest
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+if TEST_DATABASE_URL:
+    os.environ.setdefault("DATABASE_URL", TEST_DATABASE_URL)
+
+
+@pytest.fixture
+def db():
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+
+    engine = create_engine(TEST_DATABASE_URL)
+    with engine.connect() as conn:
+        trans = conn.begin()
+        session = Session(bind=conn, autoflush=False, join_transaction_mode="create_savepoint")
+        try:
+            yield session
+        finally:
+            session.close()
+            trans.rollback()
+    engine.dispose()
+
+
+@pytest.fixture
+def tenant_id(db):
+    from core.models.crm import Tenant
+
+    tenant = Tenant(name="tests")
+    db.add(tenant)
+    db.flush()
+    return tenant.id
@@ -0,0 +1,88 @@
+"""Statement budget for the /chat write path.
+
+Needs a Postgres database migrated to head (the upserts use ON CONFLICT on the
+migration-defined unique indexes):
+
+    DATABASE_URL=$TEST_DATABASE_URL alembic upgrade head
+    TEST_DATABASE_URL=postgresql+psycopg://... python -m pytest tests
+"""
+
+from __future__ import annotations
+
+import os
+import uuid
+from datetime import datetime
+
+import pytest
+
+if not os.environ.get("TEST_DATABASE_URL"):
+    pytest.skip("TEST_DATABASE_URL is not set", allow_module_level=True)
+
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from apps.api.routers.chat import ChatRequest, _record_chat  # noqa: E402
+
+LABELS = {"intent": "ticket", "tag": "billing", "sentiment": "neutral", "urgency": "normal"}
+
+
+class StatementCounter:
+    def __init__(self, session: Session):
+        self.statements: list[str] = []
+        self.commits = 0
+        self._conn = session.connection()
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def _on_commit(self, conn, *args):
+        self.commits += 1
+
+    def __enter__(self):
+        event.listen(self._conn, "before_cursor_execute", self._on_execute)
+        # the test session runs inside a savepoint, so its commit() releases one
+        event.listen(self._conn, "commit", self._on_commit)
+        event.listen(self._conn, "release_savepoint", self._on_commit)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self._conn, "before_cursor_execute", self._on_execute)
+        event.remove(self._conn, "commit", self._on_commit)
+        event.remove(self._conn, "release_savepoint", self._on_commit)
+
+
+def _turn(db, tenant_id, intent, answer, email="lead@example.com"):
+    req = ChatRequest(session_id=f"s-{uuid.uuid4()}", message="We need a quote", email=email)
+    now = datetime.utcnow()
+    with StatementCounter(db) as counter:
+        turn = _record_chat(
+            db, tenant_id, req.session_id, req, LABELS, intent, answer, now, now if answer else None
+        )
+    return turn, counter
+
+
+@pytest.mark.parametrize(
+    ("intent", "answer", "email", "budget"),
+    [
+        # conversation upsert, intent count upsert, user message
+        ("general", None, None, 3),
+        # + assistant message
+        ("general", "Hi!", None, 4),
+        # + contact upsert, ticket insert
+        ("ticket", "Hi!", "lead@example.com", 6),
+        # + contact upsert, active scoring rules, lead insert
+        ("lead", "Hi!", "lead@example.com", 7),
+    ],
+)
+def test_chat_turn_statement_budget(db, tenant_id, intent, answer, email, budget):
+    turn, counter = _turn(db, tenant_id, intent, answer, email)
+
+    assert len(counter.statements) <= budget, "\n".join(counter.statements)
+    assert counter.commits == 0  # the caller commits once, after every write
+    assert turn["message_id"] is not None
+
+
+def test_deferred_reply_is_enqueued_after_flush(db, tenant_id):
+    turn, _ = _turn(db, tenant_id, "general", None)
+
+    assert [job_id for job_id, _, _ in turn["followups"]] == [f"chat_reply:{turn['message_id']}"]
@@ -0,0 +1,52 @@
+"""Inline and set-based lead scoring must agree, including for a tenant with no rules.
+
+Needs a Postgres database migrated to head, see tests/test_chat_queries.py.
+"""
+
+from __future__ import annotations
+
+import os
+import uuid
+
+import pytest
+
+if not os.environ.get("TEST_DATABASE_URL"):
+    pytest.skip("TEST_DATABASE_URL is not set", allow_module_level=True)
+
+from core.models.crm import Contact, Lead, LeadScoreRule  # noqa: E402
+from core.scoring import recompute_tenant_scores, rescore_lead  # noqa: E402
+
+
+def _lead(db, tenant_id, summary):
+    contact = Contact(tenant_id=tenant_id, email=f"{uuid.uuid4()}@example.com")
+    db.add(contact)
+    db.flush()
+    lead = Lead(tenant_id=tenant_id, contact_id=contact.id, status="new", score=50, summary=summary)
+    db.add(lead)
+    db.flush()
+    return lead
+
+
+def test_deleting_the_last_rule_zeroes_scores_in_both_paths(db, tenant_id):
+    rule = LeadScoreRule(
+        tenant_id=tenant_id, name="pricing", field="summary", operator="contains", value="pricing", points=20
+    )
+    db.add(rule)
+    lead = _lead(db, tenant_id, "Need pricing for 40 seats")
+    db.commit()
+
+    recompute_tenant_scores(db, tenant_id)
+    assert db.get(Lead, lead.id).score == 20
+
+    # what DELETE /admin/score/rules/{id} does, then the rescore job it enqueues
+    before = {"field": rule.field, "operator": rule.operator, "value": rule.value}
+    db.delete(rule)
+    db.commit()
+    result = recompute_tenant_scores(db, tenant_id, predicates=[before])
+
+    assert result["updated"] == 1
+    assert db.get(Lead, lead.id).score == 0
+
+    other = _lead(db, tenant_id, "Need pricing as well")
+    rescore_lead(db, other)
+    assert other.score == 0